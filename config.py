@@ -2,41 +2,122 @@
 config.py
 ---------
 Loads all configuration from the .env file (or environment variables).
-Install dependency once: pip install python-dotenv
+The .env file is plain KEY=VALUE lines; variables already set in the
+environment take precedence over the file.
 """
 
 import os
-from dotenv import load_dotenv
+import sqlite3
+import threading
+from pathlib import Path
 
-# Load .env from the same directory as this file
-load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
+from envfile import load_env
+
+load_env()
+
+# Snapshot the environment once; every constant below resolves from this dict
+_ENV = dict(os.environ)
 
 # ── OpenClaw ──────────────────────────────────────────────────────────────────
-OPENCLAW_URL = os.environ["OPENCLAW_URL"]
-TOKEN        = os.environ["TOKEN"]
+OPENCLAW_URL = _ENV.get("OPENCLAW_URL", "http://localhost:18790/v1/chat/completions")
+TOKEN        = _ENV["TOKEN"]
 
 # ── IMAP (incoming mail) ──────────────────────────────────────────────────────
-IMAP_HOST = os.environ.get("IMAP_HOST", "imap.gmail.com")
-EMAIL     = os.environ["EMAIL"]
-PASSWORD  = os.environ["PASSWORD"]
+IMAP_HOST = _ENV.get("IMAP_HOST", "imap.gmail.com")
+EMAIL     = _ENV["EMAIL"]
+PASSWORD  = _ENV["PASSWORD"]
 
 # ── SMTP (outgoing mail) ──────────────────────────────────────────────────────
-SMTP_SERVER   = os.environ.get("SMTP_SERVER", "smtp.gmail.com")
-SMTP_PORT     = int(os.environ.get("SMTP_PORT", "587"))
-SMTP_EMAIL    = os.environ.get("SMTP_EMAIL", EMAIL)
-SMTP_PASSWORD = os.environ.get("SMTP_PASSWORD", PASSWORD)
+SMTP_SERVER   = _ENV.get("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT     = int(_ENV.get("SMTP_PORT", "587"))
+SMTP_EMAIL    = _ENV.get("SMTP_EMAIL", EMAIL)
+SMTP_PASSWORD = _ENV.get("SMTP_PASSWORD", PASSWORD)
 
 # ── Gemini ────────────────────────────────────────────────────────────────────
-GEMINI_API_KEY = os.environ["GEMINI_API_KEY"]
-GEMINI_MODEL   = os.environ.get("GEMINI_MODEL", "gemini-2.5-flash")
+GEMINI_API_KEY = _ENV["GEMINI_API_KEY"]
+GEMINI_MODEL   = _ENV.get("GEMINI_MODEL", "gemini-2.5-flash")
 
 # ── File paths ────────────────────────────────────────────────────────────────
-ATTACHMENT_DIR = os.environ.get("ATTACHMENT_DIR", "attachments")
-PROCESSED_LOG  = os.environ.get("PROCESSED_LOG", "processed_files.txt")
+# Resolved to absolute paths once; the attachment dir is created up front so
+# callers never need to re-check it.
+ATTACHMENT_DIR = Path(_ENV.get("ATTACHMENT_DIR", "attachments")).resolve()
+PROCESSED_LOG  = Path(_ENV.get("PROCESSED_LOG", "processed_files.txt")).resolve()
+PROCESSED_DB   = Path(_ENV.get("PROCESSED_DB", "processed_files.db")).resolve()
+GEMINI_CACHE   = Path(_ENV.get("GEMINI_CACHE", ".gemini_cache.db")).resolve()
+UID_STATE_DB   = Path(_ENV.get("UID_STATE_DB", ".uid_state.db")).resolve()
+ANALYSIS_CACHE = Path(_ENV.get("ANALYSIS_CACHE", ".analysis_cache.db")).resolve()
+ATTACHMENT_DIR.mkdir(parents=True, exist_ok=True)
 
 # ── Polling ───────────────────────────────────────────────────────────────────
-CHECK_INTERVAL = int(os.environ.get("CHECK_INTERVAL", "30"))
+CHECK_INTERVAL = int(_ENV.get("CHECK_INTERVAL", "30"))
+
+# ── Document index (passed into every OpenClaw prompt) ────────────────────────
+DOCUMENT_INDEX_DB = _ENV.get(
+    "DOCUMENT_INDEX_DB",
+    "/home/randomwalk/.openclaw/workspace/multilingual-document-processor/scripts/document_index.db",
+)
+
+OPENAI_API_KEY = _ENV.get("OPENAI_API_KEY")
+
+OPENAI_MODEL = "gpt-4o"
+
+
+# ── Pre-built connection arguments (unpacked with * at call sites) ───────────
+IMAP_ARGS  = (IMAP_HOST,)
+IMAP_CREDS = (EMAIL, PASSWORD)
+SMTP_ARGS  = (SMTP_SERVER, SMTP_PORT)
+SMTP_CREDS = (SMTP_EMAIL, SMTP_PASSWORD)
+
+
+# ── Processed-file tracking ───────────────────────────────────────────────────
+# Filenames live in a SQLite table (WAL mode): lookups hit the primary-key
+# index, each mark is one INSERT, and every pipeline process sees the others'
+# marks at once. A legacy PROCESSED_LOG text file is imported when the table
+# is first created. Names are never un-marked, so every positive answer is
+# also kept in memory; only unknown names go to the database.
+
+_processed_db: sqlite3.Connection | None = None
+_processed_lock = threading.Lock()
+_processed_seen: set[str] = set()
+
+
+def _processed() -> sqlite3.Connection:
+    global _processed_db
+    if _processed_db is None:
+        db = sqlite3.connect(PROCESSED_DB, isolation_level=None,
+                             check_same_thread=False, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        fresh = db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'processed'"
+        ).fetchone() is None
+        db.execute("CREATE TABLE IF NOT EXISTS processed (filename TEXT PRIMARY KEY)")
+        if fresh and PROCESSED_LOG.exists():
+            with open(PROCESSED_LOG, "r", encoding="utf-8") as f:
+                names = [(line.strip(),) for line in f if line.strip()]
+            with db:
+                db.executemany("INSERT OR IGNORE INTO processed (filename) VALUES (?)", names)
+        _processed_db = db
+    return _processed_db
+
+
+def is_processed(filename: str) -> bool:
+    """True if *filename* was recorded by mark_processed (in any process)."""
+    if filename in _processed_seen:
+        return True
+    with _processed_lock:
+        found = _processed().execute(
+            "SELECT 1 FROM processed WHERE filename = ?", (filename,)
+        ).fetchone() is not None
+        if found:
+            _processed_seen.add(filename)
+    return found
 
-OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 
-OPENAI_MODEL = "gpt-4o"
\ No newline at end of file
+def mark_processed(filename: str) -> None:
+    """Record *filename* as processed. Safe to call from several threads and
+    from several pipeline processes."""
+    with _processed_lock:
+        _processed().execute(
+            "INSERT OR IGNORE INTO processed (filename) VALUES (?)", (filename,)
+        )
+        _processed_seen.add(filename)
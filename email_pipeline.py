@@ -16,27 +16,41 @@ Flow:
 No images / vision API used anywhere — only plain text extraction.
 """
 
+import atexit
+import binascii
+import codecs
 import datetime
+import functools
+import hashlib
 import imaplib
+import importlib.util
+import io
 import json
+import logging
+import logging.handlers
+import mmap
 import os
+import queue
+import re
+import signal
 import smtplib
+import socket
+import sqlite3
 import sys
+import threading
 import time
-from email import encoders
-from email.mime.base import MIMEBase
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from email.header import decode_header, make_header
+from email.message import Message
+from email.mime.application import MIMEApplication
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
+from itertools import chain, islice, repeat
 
-import pyzmail
 import requests
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4, landscape
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import cm
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # ── Local modules ──────────────────────────────────────────────────────────────
 from extract_text import extract_text as extract_docx_text   # for DOCX/DOC
@@ -44,94 +58,339 @@ from krutidev_converter import krutidev_to_unicode, unicode_to_krutidev  # for h
 
 # ── Config ─────────────────────────────────────────────────────────────────────
 from config import (
-    IMAP_HOST, EMAIL, PASSWORD,
-    SMTP_SERVER, SMTP_PORT, SMTP_EMAIL, SMTP_PASSWORD,
+    IMAP_ARGS, IMAP_CREDS,
+    SMTP_ARGS, SMTP_CREDS, SMTP_EMAIL,
     OPENCLAW_URL, TOKEN,
     GEMINI_API_KEY, GEMINI_MODEL,
-    ATTACHMENT_DIR, PROCESSED_LOG,
+    ATTACHMENT_DIR, GEMINI_CACHE, UID_STATE_DB,
+    is_processed, mark_processed,
     CHECK_INTERVAL,
 )
 
+# google-genai, pypdf and reportlab are slow to import, so they are imported
+# on first use (_get_gemini_client, _pdf_reader, create_reply_pdf). Only their
+# presence is checked here, so a missing package still fails at startup.
+
+def _installed(name: str) -> bool:
+    try:
+        return importlib.util.find_spec(name) is not None
+    except ModuleNotFoundError:     # parent package missing
+        return False
+
+
 # ── Gemini SDK ─────────────────────────────────────────────────────────────────
-try:
-    from google import genai as google_genai
-except ImportError:
+if not _installed("google.genai"):
     print("ERROR: google-genai not installed. Run: pip install google-genai")
     sys.exit(1)
 
-# ── pypdf for PDF text extraction ──────────────────────────────────────────────
+# ── pypdf for PDF text extraction (PyPDF2 as fallback) ─────────────────────────
+if not (_installed("pypdf") or _installed("PyPDF2")):
+    print("ERROR: pypdf not installed. Run: pip install pypdf")
+    sys.exit(1)
+
+# ── reportlab for the reply PDF ────────────────────────────────────────────────
+if not _installed("reportlab"):
+    print("ERROR: reportlab not installed. Run: pip install reportlab")
+    sys.exit(1)
+
+# ── pypdfium2 (native PDFium) — optional fast path, pypdf is the fallback ─────
+# PDFium is not thread-safe (not even across documents) and emails are handled
+# on several threads, so every call into it holds _PDFIUM_LOCK.
 try:
-    from pypdf import PdfReader
+    import pypdfium2 as pdfium
 except ImportError:
-    try:
-        from PyPDF2 import PdfReader      # fallback
-    except ImportError:
-        print("ERROR: pypdf not installed. Run: pip install pypdf")
-        sys.exit(1)
+    pdfium = None
+_PDFIUM_LOCK = threading.Lock()
+
+# ── orjson — optional fast JSON codec, stdlib json is the fallback ────────────
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-# ─────────────────────────────────────────────────────────────────────────────
-# Logging helper
-# ─────────────────────────────────────────────────────────────────────────────
 
-def log(msg: str) -> None:
-    ts = datetime.datetime.now().strftime("%H:%M:%S")
-    print(f"[{ts}] {msg}", flush=True)
+def _json_loads(data: str | bytes):
+    return orjson.loads(data) if orjson else json.loads(data)
 
 
+def _json_dumps(obj, indent: bool = False) -> str:
+    """Serialise *obj* as UTF-8 JSON text (non-ASCII kept as-is)."""
+    if orjson:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, option=option).decode()
+    return json.dumps(obj, indent=2 if indent else None, ensure_ascii=False)
+
 # ─────────────────────────────────────────────────────────────────────────────
-# Processed-file tracking
+# Logging helper
 # ─────────────────────────────────────────────────────────────────────────────
 
-def load_processed() -> set:
-    if not os.path.exists(PROCESSED_LOG):
-        return set()
-    with open(PROCESSED_LOG, "r", encoding="utf-8") as f:
-        return {line.strip() for line in f if line.strip()}
+# Records are handed to a queue and written to stdout by a listener thread,
+# so worker threads never block on terminal I/O. Pass %-style *args* to defer
+# formatting: it is skipped entirely when INFO is disabled.
+_logger = logging.getLogger("email_pipeline")
+_logger.setLevel(logging.INFO)
+_logger.propagate = False
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+_log_handler = logging.StreamHandler(sys.stdout)
+_log_handler.setFormatter(logging.Formatter("[%(asctime)s] %(message)s", "%H:%M:%S"))
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)          # drain pending records on exit
+_logger.addHandler(logging.handlers.QueueHandler(_log_queue))
 
 
-def mark_processed(filename: str) -> None:
-    with open(PROCESSED_LOG, "a", encoding="utf-8") as f:
-        f.write(filename + "\n")
+def log(msg: str, *args) -> None:
+    _logger.info(msg, *args)
 
 
 # ─────────────────────────────────────────────────────────────────────────────
 # STEP 2 — Download attachments
 # ─────────────────────────────────────────────────────────────────────────────
 
-SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".doc", ".txt"}
+SUPPORTED_EXTENSIONS = frozenset({".pdf", ".docx", ".doc", ".txt"})
+
+
+# Attachments are located from the message's BODYSTRUCTURE and only the
+# wanted MIME parts are fetched, so a large message is never parsed (and its
+# attachments decoded) in memory as a whole.
+
+# Encoded bytes decoded per step when saving a base64 attachment, and the
+# file buffer those pieces are collected in before each write() syscall
+_DECODE_CHUNK = 64 * 1024
+_WRITE_BUFFER = 1024 * 1024
 
+# Saving (decode + write) one attachment overlaps with fetching the next part
+_SAVE_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="save")
 
-def save_attachment(filename: str, payload: bytes) -> str:
-    """Save bytes to ATTACHMENT_DIR — returns saved path."""
-    os.makedirs(ATTACHMENT_DIR, exist_ok=True)
+_IMAP_TOKEN_RE = re.compile(
+    rb'\s*(?:(?P<open>\()|(?P<close>\))|"(?P<quoted>(?:[^"\\]|\\.)*)"'
+    rb'|\{(?P<literal>\d+)\}$|(?P<atom>[^\s()"\[]+(?:\[[^\]]*\](?:<[\d.]+>)?)?))'
+)
+
+
+def _parse_imap_response(data: list) -> list:
+    """
+    Parse raw imaplib response data (lines and (line, literal) tuples) into
+    nested lists: atoms, quoted strings and literals become bytes, NIL None.
+    """
+    stack: list[list] = [[]]
+    for piece in data:
+        if piece is None:
+            continue
+        line, literal = piece if isinstance(piece, tuple) else (piece, None)
+        pos = 0
+        while (m := _IMAP_TOKEN_RE.match(line, pos)) and m.end() > pos:
+            pos = m.end()
+            if m["open"]:
+                stack.append([])
+            elif m["close"]:
+                if len(stack) > 1:
+                    done = stack.pop()
+                    stack[-1].append(done)
+            elif m["quoted"] is not None:
+                stack[-1].append(re.sub(rb"\\(.)", rb"\1", m["quoted"]))
+            elif m["literal"] is not None:
+                stack[-1].append(literal)
+            else:
+                atom = m["atom"]
+                stack[-1].append(None if atom.upper() == b"NIL" else atom)
+    return stack[0]
+
+
+def _fetch_items(server: imaplib.IMAP4_SSL, uid_set: bytes,
+                 items: str) -> dict[bytes, dict[bytes, object]]:
+    """Run one UID FETCH and return {uid: {ITEM NAME: value}}."""
+    _, data = server.uid("FETCH", uid_set, items)
+    top = _parse_imap_response(data or [])
+    result: dict[bytes, dict[bytes, object]] = {}
+    for attrs in top[1::2]:          # (message number, attribute list) pairs
+        if not isinstance(attrs, list):
+            continue
+        attrs = {k.upper(): v for k, v in zip(attrs[::2], attrs[1::2]) if isinstance(k, bytes)}
+        uid = attrs.get(b"UID")
+        if isinstance(uid, bytes):
+            result.setdefault(uid, {}).update(attrs)
+    return result
+
+
+def _text(value) -> str:
+    return value.decode("utf-8", errors="replace") if isinstance(value, bytes) else ""
+
+
+def _iter_parts(bodystructure: list, part_id: str = ""):
+    """Yield (part_id, part) for every leaf part of a parsed BODYSTRUCTURE."""
+    if bodystructure and isinstance(bodystructure[0], list):    # multipart
+        n = 0
+        for child in bodystructure:
+            if not isinstance(child, list):     # subtype — children end here
+                break
+            n += 1
+            yield from _iter_parts(child, f"{part_id}.{n}" if part_id else str(n))
+    elif bodystructure:
+        yield part_id or "1", bodystructure
+
+
+def _part_info(part: list) -> tuple[str, str, str | None, Message]:
+    """
+    Return (content_type, transfer_encoding, filename, headers) for one
+    BODYSTRUCTURE leaf. *headers* is a Message carrying the part's
+    Content-Type / Content-Disposition so email's own RFC 2231 parameter
+    handling can be reused.
+    """
+    def header(value: str, params) -> str:
+        if not isinstance(params, list):
+            return value
+        pairs = zip(params[::2], params[1::2])
+        return value + "".join(
+            '; {}="{}"'.format(_text(k), _text(v).replace("\\", "\\\\").replace('"', '\\"'))
+            for k, v in pairs
+        )
+
+    ctype    = f"{_text(part[0])}/{_text(part[1])}".lower()
+    encoding = _text(part[5]).lower() if len(part) > 5 else ""
+
+    # Extension data starts after the type-specific fields
+    ext = 10 if ctype == "message/rfc822" else 8 if ctype.startswith("text/") else 7
+    disposition = part[ext + 1] if len(part) > ext + 1 else None
+
+    headers = Message()
+    headers["Content-Type"] = header(ctype, part[2] if len(part) > 2 else None)
+    if isinstance(disposition, list) and disposition:
+        headers["Content-Disposition"] = header(_text(disposition[0]).lower(),
+                                                disposition[1] if len(disposition) > 1 else None)
+
+    filename = headers.get_filename()
+    if filename and "=?" in filename:
+        filename = _decode_header_value(filename)
+    return ctype, encoding, filename, headers
+
+
+@functools.lru_cache(maxsize=4096)
+def _decode_header_value(value: str) -> str:
+    """Decode RFC 2047 encoded-words; returns *value* unchanged if that fails.
+    Cached, since a retried message brings the same raw header back."""
+    if "=?" not in value:
+        return value
+    try:
+        return str(make_header(decode_header(value)))
+    except (LookupError, UnicodeError, ValueError):
+        return value
+
+
+def _decode_part(data: bytes, encoding: str) -> bytes:
+    if encoding == "base64":
+        return binascii.a2b_base64(data)
+    if encoding == "quoted-printable":
+        return binascii.a2b_qp(data)
+    return data
+
+
+def _fetch_part(server: imaplib.IMAP4_SSL, uid: bytes, part_id: str) -> bytes | None:
+    """Fetch the still-encoded bytes of one MIME part (BODY.PEEK keeps \\Seen)."""
+    attrs = _fetch_items(server, uid, f"(BODY.PEEK[{part_id}])").get(uid, {})
+    data = attrs.get(f"BODY[{part_id}]".encode())
+    return data if isinstance(data, bytes) else None
+
+
+def save_attachment(filename: str, data: bytes, encoding: str = "") -> str:
+    """
+    Decode *data* (transfer *encoding*: base64, quoted-printable or raw) into
+    ATTACHMENT_DIR — returns saved path. base64 and quoted-printable are
+    decoded and written in _DECODE_CHUNK pieces rather than as one decoded copy.
+    """
     base, ext = os.path.splitext(filename)
-    dest = os.path.join(ATTACHMENT_DIR, filename)
-    counter = 1
-    while os.path.exists(dest):
-        dest = os.path.join(ATTACHMENT_DIR, f"{base}_{counter}{ext}")
-        counter += 1
-    with open(dest, "wb") as f:
-        f.write(payload)
-    log(f"  [STEP 2] Saved: {dest} ({len(payload):,} bytes)")
-    return dest
-
-
-def extract_attachments(msg: pyzmail.PyzMessage) -> list[str]:
-    """Return saved paths for all supported attachments."""
-    paths = []
-    for part in msg.mailparts:
-        filename = part.filename
+    dest = ATTACHMENT_DIR / filename
+    # Claim the original name atomically; on a collision claim a random
+    # "<base>_XXXXXXXX<ext>" instead of probing _1, _2, … (not mkstemp: its
+    # files are 0600, and saved attachments should be 0644 like the rest)
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    while True:
+        try:
+            fd = os.open(dest, flags, 0o644)
+            break
+        except FileExistsError:
+            dest = ATTACHMENT_DIR / f"{base}_{uuid.uuid4().hex[:8]}{ext}"
+
+    size = 0
+    view = memoryview(data)
+    with os.fdopen(fd, "wb", buffering=_WRITE_BUFFER) as f:
+        if encoding == "base64":
+            carry = b""
+            for i in range(0, len(data), _DECODE_CHUNK):
+                chunk = carry + bytes(view[i : i + _DECODE_CHUNK]).translate(None, b" \t\r\n")
+                cut   = len(chunk) - len(chunk) % 4
+                size += f.write(binascii.a2b_base64(chunk[:cut]))
+                carry = chunk[cut:]
+            if carry:           # unpadded tail — pad it like email's decoder does
+                try:
+                    size += f.write(binascii.a2b_base64(carry + b"=" * (-len(carry) % 4)))
+                except binascii.Error:
+                    pass
+        elif encoding == "quoted-printable":
+            # Cut after a newline so no =XX escape or soft break is split
+            start = 0
+            while start < len(data):
+                end = data.find(b"\n", start + _DECODE_CHUNK) + 1 or len(data)
+                size += f.write(binascii.a2b_qp(view[start:end]))
+                start = end
+        else:           # 7bit / 8bit / binary — written as fetched
+            size += f.write(data)
+    log("  [STEP 2] Saved: %s (%s bytes)", dest, format(size, ","))
+    return str(dest)
+
+
+# bytes.decode() has a C fast path for the standard UTF-8/ASCII names; any
+# other charset costs a codec-registry lookup, so those decoders are cached.
+_FAST_CHARSETS = frozenset({"utf-8", "utf8", "us-ascii", "ascii"})
+
+
+@functools.lru_cache(maxsize=32)
+def _charset_decoder(charset: str):
+    try:
+        return codecs.lookup(charset).decode
+    except LookupError:                     # unknown charset name
+        return codecs.utf_8_decode
+
+
+def _decode_text(raw: bytes, charset: str | None) -> str:
+    """Decode a text part in *charset* (default UTF-8), dropping bad bytes."""
+    charset = (charset or "utf-8").lower()
+    if charset in _FAST_CHARSETS:
+        return raw.decode(charset, errors="ignore")
+    return _charset_decoder(charset)(raw, "ignore")[0]
+
+
+def fetch_body_text(server: imaplib.IMAP4_SSL, uid: bytes, bodystructure: list) -> str:
+    """Fetch and decode the first text/plain part that isn't an attachment."""
+    for part_id, part in _iter_parts(bodystructure):
+        ctype, encoding, filename, headers = _part_info(part)
+        if ctype != "text/plain" or filename:
+            continue
+        data = _fetch_part(server, uid, part_id)
+        if data is None:
+            break
+        return _decode_text(_decode_part(data, encoding), headers.get_content_charset())
+    return "(No text body)"
+
+
+def extract_attachments_streaming(server: imaplib.IMAP4_SSL, uid: bytes,
+                                  bodystructure: list) -> list[str]:
+    """Fetch and save only the supported attachment parts; returns saved paths."""
+    saves: list[Future] = []
+    for part_id, part in _iter_parts(bodystructure):
+        _, encoding, filename, _ = _part_info(part)
         if not filename:
             continue
+        filename = os.path.basename(filename.replace("\\", "/"))
         ext = os.path.splitext(filename)[1].lower()
         if ext not in SUPPORTED_EXTENSIONS:
             continue
-        payload = part.get_payload()
-        if not isinstance(payload, bytes):
+        data = _fetch_part(server, uid, part_id)
+        if data is None:
             continue
-        path = save_attachment(filename, payload)
-        paths.append(path)
-    return paths
+        saves.append(_SAVE_POOL.submit(save_attachment, filename, data, encoding))
+        del data
+    return [future.result() for future in saves]
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -146,15 +405,71 @@ def extract_attachments(msg: pyzmail.PyzMessage) -> list[str]:
 #   3. If the converted result contains Devanagari chars → it was Krutidev.
 #   4. If not → it was English (conversion is a no-op on real English text).
 
+_DEVANAGARI_RE = re.compile('[\u0900-\u097f]')
+
+
 def _contains_devanagari(text: str) -> bool:
     """Return True if *text* contains any Devanagari Unicode character."""
-    return any('\u0900' <= c <= '\u097f' for c in text)
+    return _DEVANAGARI_RE.search(text) is not None
+
+
+_PdfReader = None
+
+
+def _pdf_reader(pdf_path: str):
+    """
+    Open *pdf_path* with pypdf (or PyPDF2), importing it on first use. The
+    file is memory-mapped: given a path, pypdf would read() it whole into a
+    BytesIO first, while a mapping is parsed straight from the page cache.
+    """
+    global _PdfReader
+    if _PdfReader is None:
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            from PyPDF2 import PdfReader      # fallback
+        _PdfReader = PdfReader
+    with open(pdf_path, "rb") as f:
+        return _PdfReader(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def _join_page_texts(texts) -> str:
+    """Write each non-empty page text, newline-terminated, into one buffer."""
+    buf = io.StringIO()
+    for t in texts:
+        if t:
+            buf.write(t)
+            buf.write("\n")
+    return buf.getvalue()
 
 
 def _extract_pdf_text(pdf_path: str) -> str:
-    """Extract plain text from PDF using pypdf (no images)."""
-    reader = PdfReader(pdf_path)
-    return "\n".join(page.extract_text() or "" for page in reader.pages)
+    """
+    Extract plain text from PDF (no images).
+    Uses pypdfium2 when installed; falls back to pypdf if it is missing or fails.
+    """
+    if pdfium is not None:
+        try:
+            with _PDFIUM_LOCK:
+                pdf = pdfium.PdfDocument(pdf_path)
+                try:
+                    texts = []
+                    for page in pdf:
+                        # Closed under the lock, not later by a finalizer
+                        textpage = page.get_textpage()
+                        texts.append(textpage.get_text_range())
+                        textpage.close()
+                        page.close()
+                finally:
+                    pdf.close()
+            return _join_page_texts(texts)
+        except Exception as e:
+            log(f"  [STEP 3] pypdfium2 extraction failed ({e}) — falling back to pypdf.")
+
+    # Serial on purpose: this runs on worker threads, where forking (or
+    # spawning a re-import of this module) for a process pool isn't safe
+    reader = _pdf_reader(pdf_path)
+    return _join_page_texts(page.extract_text() for page in reader.pages)
 
 
 def _detect_and_convert_text(raw_text: str, file_path: str | None = None,
@@ -235,7 +550,9 @@ def extract_and_save_text(file_path: str) -> tuple[str, str, str]:
 # STEP 4 — Gemini: find all table structures in extracted text
 # ─────────────────────────────────────────────────────────────────────────────
 
-_GEMINI_TABLE_PROMPT = """\
+# The prompt is sent as three content parts — prefix, document, suffix — so
+# the document text is never copied into a formatted prompt string.
+_GEMINI_PROMPT_PREFIX = """\
 You are a document analysis assistant.
 
 Below is the plain-text content extracted from a document.
@@ -251,46 +568,116 @@ Your task:
   3. After the human-readable analysis, output a JSON block in this exact format:
 
 ```json
-{{
-  "columns_by_table": {{
+{
+  "columns_by_table": {
     "table_1": ["Col A", "Col B", …],
     "table_2": ["Col X", "Col Y", …]
-  }}
-}}
+  }
+}
 ```
 
   4. Do NOT invent data. Only describe what is actually in the text.
 
 --- DOCUMENT TEXT START ---
-{document_text}
+"""
+
+_GEMINI_PROMPT_SUFFIX = """
 --- DOCUMENT TEXT END ---
 
 Now provide the analysis followed by the JSON block.
 """
 
+# Stay well inside the model's context window; longer documents keep their
+# head and tail, which is where table titles and totals usually sit.
+_GEMINI_MAX_DOC_CHARS = 900_000
+
+
+def _clip_for_gemini(text: str) -> str:
+    if len(text) <= _GEMINI_MAX_DOC_CHARS:
+        return text
+    half = _GEMINI_MAX_DOC_CHARS // 2
+    log(f"  [STEP 4] Text too long ({len(text):,} chars) — sending first and "
+        f"last {half:,} chars only.")
+    return text[:half] + "\n\n[… truncated …]\n\n" + text[-half:]
+
+
+_GEMINI_CLIENT = None
+
+# Gemini calls are network-bound; handle_email submits them here so they
+# overlap with extraction of the remaining attachments.
+_GEMINI_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="gemini")
+
+
+def _get_gemini_client():
+    """Return the shared Gemini client (built on first use, reused afterwards)."""
+    global _GEMINI_CLIENT
+    if _GEMINI_CLIENT is None:
+        from google import genai as google_genai
+        _GEMINI_CLIENT = google_genai.Client(api_key=GEMINI_API_KEY)
+    return _GEMINI_CLIENT
+
+
+# ── Gemini result cache ──────────────────────────────────────────────────────
+# Keyed by sha256 of the extracted text, so re-sent / forwarded attachments
+# skip the Gemini round trip entirely. Shared across the Gemini worker threads.
+
+_gemini_cache_db: sqlite3.Connection | None = None
+_gemini_cache_lock = threading.Lock()
+
+
+def _gemini_cache() -> sqlite3.Connection:
+    global _gemini_cache_db
+    if _gemini_cache_db is None:
+        _gemini_cache_db = sqlite3.connect(GEMINI_CACHE, isolation_level=None,
+                                           check_same_thread=False)
+        _gemini_cache_db.execute(
+            "CREATE TABLE IF NOT EXISTS columns (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+    return _gemini_cache_db
+
+
+def _gemini_cache_get(key: str) -> dict[str, list[str]] | None:
+    with _gemini_cache_lock:
+        row = _gemini_cache().execute(
+            "SELECT value FROM columns WHERE key = ?", (key,)
+        ).fetchone()
+    return _json_loads(row[0]) if row else None
+
+
+def _gemini_cache_put(key: str, columns_by_page: dict[str, list[str]]) -> None:
+    with _gemini_cache_lock:
+        _gemini_cache().execute(
+            "INSERT OR REPLACE INTO columns (key, value) VALUES (?, ?)",
+            (key, _json_dumps(columns_by_page)),
+        )
+
 
 def get_columns_from_gemini(text: str) -> dict[str, list[str]]:
     """
     Send plain text to Gemini.
     - Prints the full human-readable table analysis to terminal.
     - Returns columns_by_page dict: {"table_1": ["Col A", ...], ...}
+    - Successfully parsed results are cached by text hash (see GEMINI_CACHE).
     """
-    client = google_genai.Client(api_key=GEMINI_API_KEY)
-    prompt = _GEMINI_TABLE_PROMPT.format(document_text=text)
+    cache_key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    cached = _gemini_cache_get(cache_key)
+    if cached is not None:
+        log(f"  [STEP 4] Gemini cache hit — columns: {cached}")
+        return cached
+
+    client = _get_gemini_client()
 
     log(f"  [STEP 4] Sending text to Gemini ({GEMINI_MODEL}) …")
     response = client.models.generate_content(
         model=GEMINI_MODEL,
-        contents=prompt,
+        contents=[_GEMINI_PROMPT_PREFIX, _clip_for_gemini(text), _GEMINI_PROMPT_SUFFIX],
     )
     full_response = response.text
 
-    # Print the full analysis to terminal
-    print("\n" + "=" * 70)
-    print("  GEMINI TABLE ANALYSIS:")
-    print("=" * 70)
-    print(full_response)
-    print("=" * 70 + "\n")
+    # Print the full analysis to terminal (one write, so concurrent calls
+    # don't interleave their blocks)
+    rule = "=" * 70
+    log("\n%s\n  GEMINI TABLE ANALYSIS:\n%s\n%s\n%s\n", rule, rule, full_response, rule)
 
     # Extract structured JSON from the response
     columns_by_page: dict[str, list[str]] = {}
@@ -299,9 +686,10 @@ def get_columns_from_gemini(text: str) -> dict[str, list[str]]:
         end   = full_response.rfind("```")
         if start != -1 and end != -1 and end > start:
             json_str = full_response[start + 7 : end].strip()
-            parsed = json.loads(json_str)
+            parsed = _json_loads(json_str)
             columns_by_page = parsed.get("columns_by_table", {})
             log(f"  [STEP 4] Columns extracted: {columns_by_page}")
+            _gemini_cache_put(cache_key, columns_by_page)
         else:
             log("  [STEP 4] No JSON block found in Gemini response.")
     except Exception as e:
@@ -314,6 +702,22 @@ def get_columns_from_gemini(text: str) -> dict[str, list[str]]:
 # STEP 5 — OpenClaw: enrich with email context + table details
 # ─────────────────────────────────────────────────────────────────────────────
 
+# One pooled keep-alive session for every OpenClaw call; auth headers are set
+# once here. Only connection failures are retried — a POST that reached the
+# agent is never replayed.
+_OPENCLAW_SESSION = requests.Session()
+_OPENCLAW_SESSION.headers.update({
+    "Authorization": f"Bearer {TOKEN}",
+    "Content-Type": "application/json",
+    "x-openclaw-agent-id": "main",
+})
+_openclaw_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8,
+                                max_retries=Retry(total=3, connect=3, read=0,
+                                                  status=0, backoff_factor=0.5))
+_OPENCLAW_SESSION.mount("http://",  _openclaw_adapter)
+_OPENCLAW_SESSION.mount("https://", _openclaw_adapter)
+
+
 def call_openclaw(subject: str, sender: str, body: str,
                   columns_by_page: dict[str, list[str]],
                   language: str = "English") -> dict | None:
@@ -350,7 +754,7 @@ However, your entire response — including the 'suggested_reply' field and all
 MUST be written in English only. Do NOT use any Hindi or Devanagari script.
 
 AVAILABLE TABLES & COLUMNS (extracted from attachments):
-{json.dumps(columns_by_page, indent=2, ensure_ascii=False)}
+{_json_dumps(columns_by_page, indent=True)}
 
 Your response MUST include a 'tables' field which is a LIST of objects.
 Each object in the 'tables' list should have:
@@ -369,17 +773,13 @@ Body    :
         "model": "openclaw",
         "messages": [{"role": "user", "content": prompt}],
     }
-    headers = {
-        "Authorization": f"Bearer {TOKEN}",
-        "Content-Type": "application/json",
-        "x-openclaw-agent-id": "main",
-    }
 
     log("  [STEP 5] Calling OpenClaw …")
     try:
-        resp = requests.post(OPENCLAW_URL, headers=headers, json=payload, timeout=90)
+        resp = _OPENCLAW_SESSION.post(OPENCLAW_URL, data=_json_dumps(payload).encode(),
+                                      timeout=90)
         resp.raise_for_status()
-        raw = resp.json()["choices"][0]["message"]["content"]
+        raw = _json_loads(resp.content)["choices"][0]["message"]["content"]
         log("--- OpenClaw response (first 25000 chars) ---")
         log(raw[:25000])
         log("-------------------------------------------")
@@ -395,7 +795,7 @@ def _parse_json(raw: str) -> dict | None:
         start, end = cleaned.find("{"), cleaned.rfind("}")
         if start == -1 or end == -1:
             raise ValueError("No JSON object found.")
-        return json.loads(cleaned[start : end + 1])
+        return _json_loads(cleaned[start : end + 1])
     except Exception as e:
         log(f"  [STEP 5] JSON parse error: {e}")
         return None
@@ -405,10 +805,9 @@ def _parse_json(raw: str) -> dict | None:
 # STEP 6 — Build reply PDF
 # ─────────────────────────────────────────────────────────────────────────────
 
-# ── Krutidev font registration helper ─────────────────────────────────────────
+# ── Font resolution (runs once, on the first Hindi / Krutidev reply) ───────
 
-_KRUTIDEV_FONT_REGISTERED = False
-_KRUTIDEV_FONT_NAME       = "KrutiDev010"
+_KRUTIDEV_FONT_NAME = "KrutiDev010"
 
 _KRUTIDEV_SEARCH_PATHS = [
     r"C:\Windows\Fonts\KRDEV010.TTF",
@@ -419,39 +818,6 @@ _KRUTIDEV_SEARCH_PATHS = [
     os.path.join(os.path.dirname(__file__), "Kruti Dev 010.ttf"),
 ]
 
-
-def _ensure_krutidev_font() -> tuple[str, str]:
-    """
-    Register Kruti Dev 010 with ReportLab (once).
-    Returns (regular_font_name, bold_font_name).
-    Falls back to NotoSansDevanagari (variable font) if Kruti Dev is absent.
-    """
-    global _KRUTIDEV_FONT_REGISTERED
-    if _KRUTIDEV_FONT_REGISTERED:
-        return _KRUTIDEV_FONT_NAME, _KRUTIDEV_FONT_NAME
-
-    path = next((p for p in _KRUTIDEV_SEARCH_PATHS if os.path.exists(p)), None)
-    if not path:
-        log("  [STEP 6] WARNING: Kruti Dev 010 font not found. "
-            "Falling back to NotoSansDevanagari for Krutidev PDF. "
-            "Install KRDEV010.TTF / KrutiDev010.ttf in C:\\Windows\\Fonts\\ "
-            "or place it next to email_pipeline.py.")
-        # Fall back to NotoSansDevanagari so at least Unicode Hindi renders
-        return _ensure_hindi_font()
-
-    try:
-        pdfmetrics.registerFont(TTFont(_KRUTIDEV_FONT_NAME, path))
-        _KRUTIDEV_FONT_REGISTERED = True
-        log(f"  [STEP 6] Kruti Dev font registered: {path}")
-        return _KRUTIDEV_FONT_NAME, _KRUTIDEV_FONT_NAME
-    except Exception as e:
-        log(f"  [STEP 6] Kruti Dev font registration failed: {e} — falling back.")
-        return _ensure_hindi_font()
-
-
-# ── Hindi font registration helper ────────────────────────────────────────────
-
-_HINDI_FONT_REGISTERED = False
 _HINDI_FONT_NAME = "NotoSansDevanagari"
 _HINDI_FONT_BOLD_NAME = "NotoSansDevanagari-Bold"
 
@@ -473,15 +839,14 @@ _NOTO_BOLD_SEARCH_PATHS = [
 ]
 
 
-def _ensure_hindi_font() -> tuple[str, str]:
+def _register_hindi_font() -> tuple[str, str]:
     """
-    Register Noto Sans Devanagari with ReportLab (once).
+    Register Noto Sans Devanagari with ReportLab.
     Returns (regular_font_name, bold_font_name).
     Falls back to Helvetica if the font file is not found.
     """
-    global _HINDI_FONT_REGISTERED
-    if _HINDI_FONT_REGISTERED:
-        return _HINDI_FONT_NAME, _HINDI_FONT_BOLD_NAME
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
 
     reg_path  = next((p for p in _NOTO_SEARCH_PATHS  if os.path.exists(p)), None)
     bold_path = next((p for p in _NOTO_BOLD_SEARCH_PATHS if os.path.exists(p)), None)
@@ -495,12 +860,8 @@ def _ensure_hindi_font() -> tuple[str, str]:
 
     try:
         pdfmetrics.registerFont(TTFont(_HINDI_FONT_NAME, reg_path))
-        if bold_path:
-            pdfmetrics.registerFont(TTFont(_HINDI_FONT_BOLD_NAME, bold_path))
-        else:
-            # Re-register regular as bold fallback
-            pdfmetrics.registerFont(TTFont(_HINDI_FONT_BOLD_NAME, reg_path))
-        _HINDI_FONT_REGISTERED = True
+        # Re-register regular as bold fallback when no bold file exists
+        pdfmetrics.registerFont(TTFont(_HINDI_FONT_BOLD_NAME, bold_path or reg_path))
         log(f"  [STEP 6] Hindi font registered: {reg_path}")
         return _HINDI_FONT_NAME, _HINDI_FONT_BOLD_NAME
     except Exception as e:
@@ -508,6 +869,77 @@ def _ensure_hindi_font() -> tuple[str, str]:
         return "Helvetica", "Helvetica-Bold"
 
 
+def _register_krutidev_font(fallback: tuple[str, str]) -> tuple[str, str]:
+    """
+    Register Kruti Dev 010 with ReportLab.
+    Returns (regular_font_name, bold_font_name), or *fallback* (the Hindi
+    fonts) if Kruti Dev is absent.
+    """
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    path = next((p for p in _KRUTIDEV_SEARCH_PATHS if os.path.exists(p)), None)
+    if not path:
+        log("  [STEP 6] WARNING: Kruti Dev 010 font not found. "
+            "Falling back to NotoSansDevanagari for Krutidev PDF. "
+            "Install KRDEV010.TTF / KrutiDev010.ttf in C:\\Windows\\Fonts\\ "
+            "or place it next to email_pipeline.py.")
+        return fallback
+
+    try:
+        pdfmetrics.registerFont(TTFont(_KRUTIDEV_FONT_NAME, path))
+        log(f"  [STEP 6] Kruti Dev font registered: {path}")
+        return _KRUTIDEV_FONT_NAME, _KRUTIDEV_FONT_NAME
+    except Exception as e:
+        log(f"  [STEP 6] Kruti Dev font registration failed: {e} — falling back.")
+        return fallback
+
+
+# (regular, bold) font names per reply language: "en", "hi", "kd".
+_RESOLVED_FONTS: dict[str, tuple[str, str]] = {"en": ("Helvetica", "Helvetica-Bold")}
+
+
+def _resolve_fonts() -> None:
+    _RESOLVED_FONTS["hi"] = _register_hindi_font()
+    _RESOLVED_FONTS["kd"] = _register_krutidev_font(fallback=_RESOLVED_FONTS["hi"])
+
+
+# Set once _resolve_fonts has run; English replies never trigger it.
+_FONTS_RESOLVED = False
+_FONTS_LOCK     = threading.Lock()
+
+
+def _fonts(lang_key: str) -> tuple[str, str]:
+    """Return (regular, bold) font names for *lang_key* ("en", "hi" or "kd")."""
+    global _FONTS_RESOLVED
+    if lang_key != "en" and not _FONTS_RESOLVED:   # English uses the built-in Helvetica
+        with _FONTS_LOCK:
+            if not _FONTS_RESOLVED:
+                _resolve_fonts()
+                _FONTS_RESOLVED = True
+    return _RESOLVED_FONTS[lang_key]
+
+
+def _table_cell(value, style: "ParagraphStyle", max_width: float):
+    """
+    Return *value* as a plain string when it fits on one line in *style*'s
+    font, so ReportLab can draw it directly; otherwise wrap it in a
+    Paragraph (needed for line wrapping, line breaks and markup).
+    """
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+    from reportlab.platypus import Paragraph
+
+    s = str(value)
+    if ("\n" in s or "<" in s or "&" in s
+            or stringWidth(s, style.fontName, style.fontSize) > max_width):
+        return Paragraph(s, style)
+    return s
+
+
+# Pads short table rows with "" up to the header count
+_EMPTY_CELLS = repeat("")
+
+
 def create_reply_pdf(tables: list[dict], subject: str, facts: list,
                      output_path: str, language: str = "English") -> str:
     """
@@ -517,17 +949,23 @@ def create_reply_pdf(tables: list[dict], subject: str, facts: list,
     - "English"          : use Helvetica
     Returns output_path.
     """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import cm
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
     is_krutidev = language == "Krutidev→Unicode"
     is_hindi    = language in ("Unicode Hindi", "Krutidev→Unicode")
 
     if is_krutidev:
-        body_font, bold_font = _ensure_krutidev_font()
+        body_font, bold_font = _fonts("kd")
         log(f"  [STEP 6] PDF language: Krutidev — using font '{body_font}'")
     elif is_hindi:
-        body_font, bold_font = _ensure_hindi_font()
+        body_font, bold_font = _fonts("hi")
         log(f"  [STEP 6] PDF language: Unicode Hindi — using font '{body_font}'")
     else:
-        body_font, bold_font = "Helvetica", "Helvetica-Bold"
+        body_font, bold_font = _fonts("en")
         log("  [STEP 6] PDF language: English — using Helvetica")
 
     page_size = landscape(A4) # default to landscape for safety with multiple tables
@@ -578,18 +1016,24 @@ def create_reply_pdf(tables: list[dict], subject: str, facts: list,
 
             story.append(Paragraph(title, tbl_title_style))
             
+            usable_w  = page_size[0] - 3 * cm
+            col_w     = usable_w / len(headers)
+            text_w    = col_w - 8   # minus LEFT/RIGHTPADDING
+
             table_body = [[Paragraph(str(h), hdr_style) for h in headers]]
             for row in rows:
-                padded = (list(row) + [""] * len(headers))[: len(headers)]
-                table_body.append([Paragraph(str(c), cell_style) for c in padded])
+                padded = islice(chain(row, _EMPTY_CELLS), len(headers))
+                table_body.append([_table_cell(c, cell_style, text_w) for c in padded])
 
-            usable_w  = page_size[0] - 3 * cm
-            col_w     = usable_w / len(headers)
             tbl = Table(table_body, colWidths=[col_w] * len(headers), repeatRows=1)
             tbl.setStyle(TableStyle([
                 ("BACKGROUND",     (0, 0), (-1, 0), colors.HexColor("#2C3E50")),
                 ("TEXTCOLOR",      (0, 0), (-1, 0), colors.white),
                 ("FONTNAME",       (0, 0), (-1, 0), bold_font),
+                # Plain-string body cells take their font from the table style
+                ("FONTNAME",       (0, 1), (-1, -1), body_font),
+                ("FONTSIZE",       (0, 1), (-1, -1), 8),
+                ("LEADING",        (0, 1), (-1, -1), 10),
                 ("ROWBACKGROUNDS", (0, 1), (-1, -1),
                     [colors.white, colors.HexColor("#F2F2F2")]),
                 ("GRID",           (0, 0), (-1, -1), 0.5, colors.HexColor("#CCCCCC")),
@@ -631,6 +1075,33 @@ def create_reply_pdf(tables: list[dict], subject: str, facts: list,
 # STEP 6 — Send reply via SMTP
 # ─────────────────────────────────────────────────────────────────────────────
 
+_smtp_server: smtplib.SMTP | None = None
+# Emails are handled on several threads; one SMTP conversation at a time.
+_smtp_lock = threading.Lock()
+
+
+def _smtp_connect() -> smtplib.SMTP:
+    """Return the shared SMTP session, connecting + STARTTLS + LOGIN on first use."""
+    global _smtp_server
+    if _smtp_server is None:
+        server = smtplib.SMTP(*SMTP_ARGS)
+        server.starttls()
+        server.login(*SMTP_CREDS)
+        _smtp_server = server
+    return _smtp_server
+
+
+def _smtp_reset() -> None:
+    """Close the shared SMTP session so the next send reconnects."""
+    global _smtp_server
+    if _smtp_server is not None:
+        try:
+            _smtp_server.quit()
+        except Exception:
+            _smtp_server.close()
+        _smtp_server = None
+
+
 def send_reply(to_email: str, subject: str, body: str,
                pdf_path: str | None = None) -> None:
     """Send email reply, optionally with PDF attachment."""
@@ -641,10 +1112,10 @@ def send_reply(to_email: str, subject: str, body: str,
     msg.attach(MIMEText(body, "plain", "utf-8"))
 
     if pdf_path and os.path.exists(pdf_path):
+        # MIMEApplication base64-encodes on construction, so the raw bytes
+        # are only referenced for the duration of this block.
         with open(pdf_path, "rb") as f:
-            part = MIMEBase("application", "octet-stream")
-            part.set_payload(f.read())
-        encoders.encode_base64(part)
+            part = MIMEApplication(f.read(), "octet-stream")
         part.add_header(
             "Content-Disposition",
             f'attachment; filename="{os.path.basename(pdf_path)}"',
@@ -652,10 +1123,17 @@ def send_reply(to_email: str, subject: str, body: str,
         msg.attach(part)
 
     try:
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SMTP_EMAIL, SMTP_PASSWORD)
-            server.sendmail(SMTP_EMAIL, to_email, msg.as_string())
+        raw_msg = msg.as_string()
+        with _smtp_lock:
+            # The server may have dropped an idle session — reconnect once.
+            for attempt in range(2):
+                try:
+                    _smtp_connect().sendmail(SMTP_EMAIL, to_email, raw_msg)
+                    break
+                except smtplib.SMTPServerDisconnected:
+                    _smtp_reset()
+                    if attempt:
+                        raise
         log(f"  [STEP 6] Reply sent to {to_email}" +
             (f" with PDF: {os.path.basename(pdf_path)}" if pdf_path else ""))
     except Exception as e:
@@ -674,16 +1152,16 @@ def handle_email(subject: str, sender: str, body: str,
     log(f"  Files   : {[os.path.basename(p) for p in attachment_paths]}")
     log("━" * 60)
 
-    processed = load_processed()
-    all_extracted_text   = []
+    any_text             = False
     all_columns_by_page: dict[str, list[str]] = {}
     detected_language    = "English"   # updated as files are processed
+    gemini_jobs: list[tuple[str, Future]] = []
 
     for file_path in attachment_paths:
         filename = os.path.basename(file_path)
 
         # ── STEP 3: Extract text ───────────────────────────────────────────
-        if filename in processed:
+        if is_processed(filename):
             log(f"  [STEP 3] '{filename}' already processed — skipping extraction.")
             continue
 
@@ -692,7 +1170,7 @@ def handle_email(subject: str, sender: str, body: str,
             log(f"  [STEP 3] No text extracted from '{filename}' — skipping.")
             continue
 
-        all_extracted_text.append(f"=== {filename} ===\n{text}")
+        any_text = True
         mark_processed(filename)
 
         # Track the dominant language (Hindi takes priority over English)
@@ -702,12 +1180,16 @@ def handle_email(subject: str, sender: str, body: str,
             detected_language = lang
 
         # ── STEP 4: Gemini — extract column headers (+ print table analysis) ──
-        columns_by_page = get_columns_from_gemini(text)
+        # Runs in the background while the next attachment is extracted.
+        gemini_jobs.append((filename, _GEMINI_POOL.submit(get_columns_from_gemini, text)))
+
+    for filename, job in gemini_jobs:
+        columns_by_page = job.result()
         all_columns_by_page.update({
             f"{filename}_{k}": v for k, v in columns_by_page.items()
         })
 
-    if not all_extracted_text:
+    if not any_text:
         log("  No text extracted from any attachment — skipping reply.")
         return
 
@@ -744,9 +1226,9 @@ def handle_email(subject: str, sender: str, body: str,
             result.get("facts", [])
 
     # ── STEP 6: Create PDF (Always English) ───────────────────────────────
-    os.makedirs(ATTACHMENT_DIR, exist_ok=True)
     ts      = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    pdf_out = os.path.join(ATTACHMENT_DIR, f"reply_{ts}.pdf")
+    # Suffix keeps names unique when several emails finish in the same second
+    pdf_out = str(ATTACHMENT_DIR / f"reply_{ts}_{uuid.uuid4().hex[:8]}.pdf")
 
     pdf_path = None
     if tables:
@@ -764,79 +1246,378 @@ def handle_email(subject: str, sender: str, body: str,
 
 
 # ─────────────────────────────────────────────────────────────────────────────
-# STEP 1 — IMAP polling loop
+# STEP 1 — IMAP polling loop (woken by IMAP IDLE)
 # ─────────────────────────────────────────────────────────────────────────────
 
-def check_inbox() -> None:
-    """Connect to Gmail, fetch unseen emails, process each one."""
-    log("[STEP 1] Connecting to Gmail IMAP …")
-    with imaplib.IMAP4_SSL(IMAP_HOST) as server:
-        server.login(EMAIL, PASSWORD)
+_imap_server: imaplib.IMAP4_SSL | None = None
+_imap_uidvalidity = 0           # UIDVALIDITY of INBOX on the current session
+
+
+def _imap_connect() -> imaplib.IMAP4_SSL:
+    """Return the shared IMAP session, logging in and selecting INBOX on first use."""
+    global _imap_server, _imap_uidvalidity
+    if _imap_server is None:
+        log("[STEP 1] Connecting to Gmail IMAP …")
+        server = imaplib.IMAP4_SSL(*IMAP_ARGS)
+        server.login(*IMAP_CREDS)
         server.select("INBOX")
+        _, data = server.response("UIDVALIDITY")
+        _imap_uidvalidity = int(data[0]) if data and data[0] else 0
+        _imap_server = server
+    return _imap_server
 
-        today = datetime.date.today().strftime("%d-%b-%Y")
-        _, uids = server.search(None, f'(UNSEEN SINCE "{today}")')
 
-        if not uids or not uids[0]:
-            log("[STEP 1] No new emails.")
+def _imap_reset() -> None:
+    """Drop the shared IMAP session so the next call to _imap_connect reconnects."""
+    global _imap_server
+    if _imap_server is not None:
+        try:
+            _imap_server.logout()
+        except Exception:
+            pass
+        _imap_server = None
+
+
+# Gmail drops an IDLE after ~10 minutes; re-issue it before that
+_IDLE_TIMEOUT = 540
+
+# Socket of the IDLE in progress, shut down by _request_stop to end it early
+_idle_socket: socket.socket | None = None
+
+
+def _idle_wait(server: imaplib.IMAP4_SSL, timeout: float = _IDLE_TIMEOUT) -> bool:
+    """
+    Block in IMAP IDLE until the server pushes an EXISTS (new mail) or
+    *timeout* seconds pass. Returns True if new mail was reported.
+    imaplib (< 3.14) has no IDLE command, so it is driven by hand here.
+    """
+    tag = server._new_tag()
+    server.send(tag + b" IDLE\r\n")
+    resp = server.readline()
+    if not resp.startswith(b"+"):
+        raise imaplib.IMAP4.error(f"IDLE rejected: {resp!r}")
+
+    global _idle_socket
+    sock     = server.socket()
+    deadline = time.monotonic() + timeout
+    new_mail = False
+    _idle_socket = sock
+    try:
+        while not new_mail and not _STOP.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            sock.settimeout(remaining)
+            try:
+                line = server.readline()
+            except TimeoutError:
+                # A timed-out socket file refuses further reads; reopen it
+                server.file = sock.makefile("rb")
+                break
+            if not line:
+                raise imaplib.IMAP4.abort("connection closed during IDLE")
+            new_mail = line.rstrip().upper().endswith(b"EXISTS")
+    finally:
+        _idle_socket = None
+        sock.settimeout(None)
+
+    server.send(b"DONE\r\n")
+    while True:      # drain untagged responses up to the IDLE completion
+        line = server.readline()
+        if not line:
+            raise imaplib.IMAP4.abort("connection closed during IDLE")
+        if line.startswith(tag):
+            break
+    return new_mail
+
+
+def wait_for_mail() -> None:
+    """
+    Return once new mail may be waiting: immediately if some arrived while
+    the last batch was being handled, otherwise when IDLE reports it or
+    times out. Servers without IDLE fall back to sleeping CHECK_INTERVAL.
+    """
+    server = _imap_connect()
+    if server.untagged_responses.pop("EXISTS", None):
+        return
+    if "IDLE" not in server.capabilities:
+        log(f"Sleeping {CHECK_INTERVAL}s …\n")
+        _STOP.wait(CHECK_INTERVAL)
+        return
+    log("[STEP 1] Waiting for new mail (IDLE) …\n")
+    _idle_wait(server)
+
+
+def check_inbox() -> None:
+    """Fetch unseen emails over the shared IMAP session, process each one.
+    A dropped connection is re-established and the poll retried once."""
+    for attempt in range(2):
+        try:
+            _poll_inbox(_imap_connect())
             return
+        except (imaplib.IMAP4.abort, OSError) as e:
+            _imap_reset()
+            if attempt:
+                raise
+            log(f"[STEP 1] IMAP connection lost ({e}) — reconnecting …")
 
-        uid_list = uids[0].split()
-        log(f"[STEP 1] Found {len(uid_list)} new email(s).")
 
-        for uid in uid_list:
-            _, raw_data = server.fetch(uid, "(RFC822)")
-            if not raw_data or not raw_data[0]:
-                continue
+# Emails handled concurrently (each mostly waits on Gemini / OpenClaw / SMTP);
+# kept low so Gemini's rate limit is not over-subscribed. _poll_inbox submits
+# each email as soon as its attachments are saved, so steps 3-6 of one email
+# overlap with fetching the next. Only the polling thread touches IMAP.
+_MAX_EMAIL_WORKERS = 4
+_EMAIL_POOL = ThreadPoolExecutor(max_workers=_MAX_EMAIL_WORKERS, thread_name_prefix="email")
 
-            msg = pyzmail.PyzMessage.factory(raw_data[0][1])
+# Emails downloaded but not yet finished. The poller takes a slot before
+# fetching an email's attachments, so a burst of large mails waits on the
+# server instead of piling up (on disk and as queued work) ahead of the pool.
+_IN_FLIGHT = threading.BoundedSemaphore(2 * _MAX_EMAIL_WORKERS)
 
-            subject   = msg.get_subject() or "(No Subject)"
-            addresses = msg.get_addresses("from")
-            sender    = addresses[0][1] if addresses else "unknown"
+# Messages per FETCH command — keeps the command line well under server limits
+_FETCH_BATCH = 50
 
-            if msg.text_part:
-                charset = msg.text_part.charset or "utf-8"
-                body = msg.text_part.get_payload().decode(charset, errors="ignore")
-            else:
-                body = "(No text body)"
 
-            # ── STEP 2: Download attachments ──────────────────────────────
-            log("[STEP 2] Checking for attachments …")
-            attachment_paths = extract_attachments(msg)
+def _fetch_summaries(server: imaplib.IMAP4_SSL,
+                     uid_list: list[bytes]) -> list[tuple[bytes, dict[bytes, object]]]:
+    """
+    Fetch ENVELOPE + BODYSTRUCTURE for *uid_list* in batched UID FETCH
+    commands; message bodies are fetched part by part later. Nothing here
+    sets \\Seen, so a message is only marked read once it has been handled.
+    """
+    summaries = []
+    for i in range(0, len(uid_list), _FETCH_BATCH):
+        batch = uid_list[i : i + _FETCH_BATCH]
+        items = _fetch_items(server, b",".join(batch), "(UID ENVELOPE BODYSTRUCTURE)")
+        summaries.extend((uid, items[uid]) for uid in batch if uid in items)
+    return summaries
 
-            if not attachment_paths:
-                log(f"  [STEP 2] No supported attachments from {sender} — skipping.")
-                server.store(uid, "+FLAGS", "\\Seen")
-                continue
 
-            log(f"  [STEP 2] {len(attachment_paths)} attachment(s) saved.")
+# ── Handled-UID memo ─────────────────────────────────────────────────────────
+# (UIDVALIDITY, UID) of every message already handled, so a message whose
+# \\Seen STORE was lost (crash, dropped connection) is not downloaded and
+# answered again. Only touched from the polling thread.
 
-            # ── Steps 3-6 ─────────────────────────────────────────────────
-            handle_email(subject, sender, body, attachment_paths)
+_uid_db: sqlite3.Connection | None = None
 
-            # Mark as read
-            server.store(uid, "+FLAGS", "\\Seen")
+
+def _uid_state() -> sqlite3.Connection:
+    global _uid_db
+    if _uid_db is None:
+        _uid_db = sqlite3.connect(UID_STATE_DB)
+        _uid_db.execute(
+            "CREATE TABLE IF NOT EXISTS processed "
+            "(uv INTEGER NOT NULL, uid INTEGER NOT NULL, PRIMARY KEY (uv, uid))"
+        )
+    return _uid_db
+
+
+def _already_handled(uids: list[bytes]) -> set[bytes]:
+    """Return the subset of *uids* recorded as handled under the current UIDVALIDITY."""
+    handled: set[bytes] = set()
+    for i in range(0, len(uids), 500):          # stay under SQLite's variable limit
+        chunk = uids[i : i + 500]
+        rows = _uid_state().execute(
+            f"SELECT uid FROM processed WHERE uv = ? AND uid IN ({','.join('?' * len(chunk))})",
+            (_imap_uidvalidity, *map(int, chunk)),
+        )
+        handled.update(str(uid).encode() for uid, in rows)
+    return handled
+
+
+def _remember_handled(uids: list[bytes]) -> None:
+    with _uid_state() as db:                    # one transaction
+        db.executemany("INSERT OR IGNORE INTO processed (uv, uid) VALUES (?, ?)",
+                       [(_imap_uidvalidity, int(uid)) for uid in uids])
+
+
+def _mark_seen(server: imaplib.IMAP4_SSL, uids: list[bytes]) -> None:
+    """Flag *uids* \\Seen with one UID STORE per _FETCH_BATCH."""
+    for i in range(0, len(uids), _FETCH_BATCH):
+        server.uid("STORE", b",".join(uids[i : i + _FETCH_BATCH]), "+FLAGS", "(\\Seen)")
+
+
+def _envelope_fields(envelope) -> tuple[str, str]:
+    """Return (subject, sender address) from a parsed ENVELOPE."""
+    if not isinstance(envelope, list) or len(envelope) < 3:
+        return "(No Subject)", "unknown"
+    subject = _decode_header_value(_text(envelope[1])) or "(No Subject)"
+    sender  = "unknown"
+    if isinstance(envelope[2], list) and envelope[2]:
+        addr = envelope[2][0]           # (name adl mailbox host)
+        if isinstance(addr, list) and len(addr) >= 4 and addr[2] and addr[3]:
+            sender = f"{_text(addr[2])}@{_text(addr[3])}"
+    return subject, sender
+
+
+# (UIDVALIDITY, UIDNEXT, HIGHESTMODSEQ) of INBOX after the last poll that
+# left nothing to retry. While STATUS still reports the same values, no mail
+# has arrived and no flags have changed, so the UID SEARCH is skipped.
+_mailbox_state: tuple | None = None
+
+
+def _mailbox_status(server: imaplib.IMAP4_SSL) -> tuple:
+    """Return INBOX's (UIDVALIDITY, UIDNEXT, HIGHESTMODSEQ) from one STATUS;
+    HIGHESTMODSEQ is None unless the server supports CONDSTORE."""
+    condstore = "CONDSTORE" in server.capabilities
+    _, data = server.status("INBOX", "(UIDNEXT HIGHESTMODSEQ)" if condstore else "(UIDNEXT)")
+    top   = _parse_imap_response(data or [])
+    attrs = top[1] if len(top) > 1 and isinstance(top[1], list) else []
+    attrs = {k.upper(): v for k, v in zip(attrs[::2], attrs[1::2]) if isinstance(k, bytes)}
+    return _imap_uidvalidity, attrs.get(b"UIDNEXT"), attrs.get(b"HIGHESTMODSEQ")
+
+
+def _poll_inbox(server: imaplib.IMAP4_SSL) -> None:
+    """Search INBOX for today's unseen emails and run steps 2-6 on each."""
+    global _mailbox_state
+    # STATUS keeps the session alive and lets the server report new mail;
+    # EXISTS seen after this point means mail arrived during processing
+    state = _mailbox_status(server)
+    server.untagged_responses.pop("EXISTS", None)
+    if state == _mailbox_state:
+        log("[STEP 1] No new emails.")
+        return
+
+    today = datetime.date.today().strftime("%d-%b-%Y")
+    _, uids = server.uid("SEARCH", None, f'(UNSEEN SINCE "{today}")')
+
+    if not uids or not uids[0]:
+        log("[STEP 1] No new emails.")
+        _mailbox_state = state
+        return
+
+    uid_list = uids[0].split()
+    log("[STEP 1] Found %d new email(s).", len(uid_list))
+
+    # Handled before but never flagged \\Seen: just flag them this time
+    handled  = _already_handled(uid_list)
+    uid_list = [uid for uid in uid_list if uid not in handled]
+    if handled:
+        log("[STEP 1] %d already handled — marking as read only.", len(handled))
+
+    futures: list[tuple[bytes, Future]] = []
+    seen: list[bytes] = []              # handled (or skipped) — flagged at the end
+    try:
+        for uid, summary in _fetch_summaries(server, uid_list):
+            subject, sender = _envelope_fields(summary.get(b"ENVELOPE"))
+
+            bodystructure = summary.get(b"BODYSTRUCTURE")
+            if not isinstance(bodystructure, list):
+                bodystructure = []
+
+            _IN_FLIGHT.acquire()
+            future = None
+            try:
+                # ── STEP 2: Download attachments ──────────────────────────
+                log("[STEP 2] Checking for attachments …")
+                attachment_paths = extract_attachments_streaming(server, uid, bodystructure)
+                if attachment_paths:
+                    log("  [STEP 2] %d attachment(s) saved.", len(attachment_paths))
+                    body = fetch_body_text(server, uid, bodystructure)
+                    # ── Steps 3-6 run in the background while the next email is fetched
+                    future = _EMAIL_POOL.submit(handle_email, subject, sender,
+                                                body, attachment_paths)
+            finally:
+                if future is None:
+                    _IN_FLIGHT.release()
+
+            if future is None:
+                log("  [STEP 2] No supported attachments from %s — skipping.", sender)
+                seen.append(uid)
+                continue
+            future.add_done_callback(lambda _: _IN_FLIGHT.release())
+            futures.append((uid, future))
+
+        for uid, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                # Marked read all the same: an email that always fails would
+                # otherwise be re-downloaded and re-sent to the LLMs every poll
+                log("  [PIPELINE] Email %s failed: %s — marking it read.", uid.decode(), e)
+            seen.append(uid)
+    except BaseException:
+        # Let in-flight emails finish before the caller reconnects and polls
+        # again, so the retry finds their attachments already processed
+        wait([future for _, future in futures])
+        raise
+    finally:
+        # Record first, so a failed STORE can't cause a second reply next poll;
+        # then mark as read — one UID STORE for the whole poll
+        _remember_handled(seen)
+        _mark_seen(server, seen + sorted(handled))
+
+    # Our own STORE moves HIGHESTMODSEQ, so the next poll still searches
+    # once; after that an unchanged mailbox costs a single STATUS
+    _mailbox_state = state
 
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Main loop
 # ─────────────────────────────────────────────────────────────────────────────
 
+# Upper bound for the exponential reconnect back-off (1, 2, 4, … seconds)
+_RECONNECT_MAX_DELAY = 60
+
+# Set by SIGTERM/SIGINT. Every wait in the loop is a _STOP.wait(), so shutdown
+# happens once the current batch is done instead of after a full interval.
+_STOP = threading.Event()
+
+
+def _request_stop(signum, frame) -> None:
+    """Signal handler: stop after the current batch; a second signal aborts."""
+    if _STOP.is_set():
+        raise KeyboardInterrupt
+    log("Received signal %d — shutting down …", signum)
+    _STOP.set()
+    sock = _idle_socket
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)     # wakes the blocked IDLE read
+        except OSError:
+            pass
+
+
 def main() -> None:
     log("=" * 60)
     log("  Email Pipeline Starting")
     log(f"  Attachment dir : {ATTACHMENT_DIR}/")
-    log(f"  Poll interval  : {CHECK_INTERVAL}s")
+    log(f"  Wake-up        : IMAP IDLE ({CHECK_INTERVAL}s polling if unsupported)")
     log("=" * 60)
 
-    while True:
-        try:
-            check_inbox()
-        except Exception as e:
-            log(f"Error in polling loop: {e}")
-        log(f"Sleeping {CHECK_INTERVAL}s …\n")
-        time.sleep(CHECK_INTERVAL)
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, _request_stop)
+
+    failures = 0
+    try:
+        while not _STOP.is_set():
+            try:
+                check_inbox()
+                failures = 0
+            except (imaplib.IMAP4.abort, OSError) as e:
+                delay = min(_RECONNECT_MAX_DELAY, 2 ** failures)
+                failures += 1
+                log(f"[STEP 1] IMAP unavailable ({e}) — reconnecting in {delay}s …")
+                _STOP.wait(delay)
+                continue
+            except Exception as e:
+                log(f"Error in polling loop: {e}")
+                log(f"Sleeping {CHECK_INTERVAL}s …\n")
+                _STOP.wait(CHECK_INTERVAL)
+                continue
+            if _STOP.is_set():
+                break
+            try:
+                wait_for_mail()
+            except Exception as e:
+                if _STOP.is_set():
+                    break
+                # check_inbox reconnects on the next pass
+                log(f"[STEP 1] IDLE interrupted ({e}) — polling again.")
+                _imap_reset()
+    finally:
+        _imap_reset()
+        _smtp_reset()
 
 
 if __name__ == "__main__":
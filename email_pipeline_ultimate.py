@@ -2,7 +2,7 @@
 email_pipeline_enhanced.py
 ---------------------------
 Enhanced unified pipeline that:
-  1. Polls inbox for new emails with attachments (PDF, DOCX, XLSX, CSV)
+  1. Watches the inbox (IMAP IDLE) for new emails with attachments (PDF, DOCX, XLSX, CSV)
   2. Saves attachments locally
   3. Extracts text using document indexer's extraction functions
   4. Sends extracted text to OpenAI to find tables and extract column headers
@@ -17,8 +17,10 @@ Supports all document types from document_indexer_ULTIMATE.py:
   - CSV
 
 Requires:
-    pip install pyzmail36 requests openai reportlab pypdf \
+    pip install requests openai reportlab pypdf \
                 python-docx openpyxl PyPDF2
+    pip install pypdfium2        # optional, much faster PDF text extraction
+    pip install python-calamine  # optional, much faster XLSX reading
     
 All configuration lives in config.py.
 
@@ -28,22 +30,41 @@ FONT SETUP (required for Hindi/Devanagari PDF output):
   Download: https://fonts.google.com/noto/specimen/Noto+Sans+Devanagari
 """
 
+import atexit
+import binascii
+import codecs
 import datetime
+import functools
+import hashlib
 import imaplib
 import json
+import logging
+import logging.handlers
+import mmap
 import os
+import queue
 import re
+import signal
 import smtplib
+import socket
+import sqlite3
+import sys
+import threading
 import time
 import uuid
-from email import encoders
-from email.mime.base import MIMEBase
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from email.header import decode_header, make_header
+from email.message import EmailMessage, Message
+from email.parser import BytesHeaderParser, BytesParser
+from email.policy import compat32, default as default_policy
+from email.utils import parseaddr
+from itertools import chain, islice, repeat
+from xml.sax.saxutils import escape as xml_escape
 
 from openai import OpenAI
-import pyzmail
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4, landscape
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -57,25 +78,29 @@ from reportlab.pdfbase.ttfonts import TTFont
 # Import extraction functions from document indexer
 import csv as csv_module
 import docx
-from docx.shared import Pt
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls, qn
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, PatternFill, Alignment
+from openpyxl.utils import get_column_letter
 import PyPDF2
 
 from config import (
     # IMAP
-    IMAP_HOST, EMAIL, PASSWORD,
+    IMAP_ARGS, IMAP_CREDS,
     # SMTP
-    SMTP_SERVER, SMTP_PORT, SMTP_EMAIL, SMTP_PASSWORD,
+    SMTP_ARGS, SMTP_CREDS, SMTP_EMAIL,
     # OpenClaw
     OPENCLAW_URL, TOKEN,
     # OpenAI
     OPENAI_API_KEY, OPENAI_MODEL,
     # Misc
     CHECK_INTERVAL,
-    ATTACHMENT_DIR,
-    PROCESSED_LOG,
+    ATTACHMENT_DIR, ANALYSIS_CACHE,
+    is_processed, mark_processed,
+    DOCUMENT_INDEX_DB,
 )
 
 # Try to import Krutidev converter
@@ -86,6 +111,22 @@ except:
     KRUTIDEV_AVAILABLE = False
     krutidev_to_unicode = lambda x: x
 
+# pypdfium2 (native PDFium) is preferred for PDF text when installed; PyPDF2
+# remains the fallback. PDFium is not thread-safe — not even across separate
+# documents — so every call into it holds _PDFIUM_LOCK.
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+_PDFIUM_LOCK = threading.Lock()
+
+# python-calamine (Rust XLSX reader) is preferred when installed; openpyxl
+# remains the fallback
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:
+    CalamineWorkbook = None
+
 # Try to import custom DOCX extractor if available
 try:
     from extract_docx_text import extract_text as extract_docx_krutidev
@@ -98,16 +139,13 @@ except:
 # SUPPORTED FILE TYPES
 # ══════════════════════════════════════════════════════════════════════════════
 
-SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".xlsx", ".csv"}
+SUPPORTED_EXTENSIONS = frozenset({".pdf", ".docx", ".xlsx", ".csv"})
 
 # ══════════════════════════════════════════════════════════════════════════════
 # DATABASE PATH  (single config point — passed into every OpenClaw prompt)
 # ══════════════════════════════════════════════════════════════════════════════
 
-DB_PATH = os.environ.get(
-    "DOCUMENT_INDEX_DB",
-    "/home/randomwalk/.openclaw/workspace/multilingual-document-processor/scripts/document_index.db",
-)
+DB_PATH = DOCUMENT_INDEX_DB
 
 # ══════════════════════════════════════════════════════════════════════════════
 # OPENAI SETUP
@@ -119,25 +157,28 @@ openai_client = OpenAI(api_key=OPENAI_API_KEY)
 # LOGGING
 # ══════════════════════════════════════════════════════════════════════════════
 
-def log(msg: str) -> None:
-    ts = datetime.datetime.now().strftime("%H:%M:%S")
-    print(f"[{ts}] {msg}")
-
+# Records are handed to a queue and written to stdout by a listener thread,
+# so worker threads never block on terminal I/O. Pass %-style *args* to defer
+# formatting: it is skipped entirely when INFO is disabled.
+_logger = logging.getLogger("email_pipeline_ultimate")
+_logger.setLevel(logging.INFO)
+_logger.propagate = False
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+_log_handler = logging.StreamHandler(sys.stdout)
+_log_handler.setFormatter(logging.Formatter("[%(asctime)s] %(message)s", "%H:%M:%S"))
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)          # drain pending records on exit
+_logger.addHandler(logging.handlers.QueueHandler(_log_queue))
 
-# ══════════════════════════════════════════════════════════════════════════════
-# PROCESSED FILE TRACKING
-# ══════════════════════════════════════════════════════════════════════════════
 
-def load_processed() -> set:
-    if not os.path.exists(PROCESSED_LOG):
-        return set()
-    with open(PROCESSED_LOG, "r", encoding="utf-8") as f:
-        return set(line.strip() for line in f if line.strip())
+def log(msg: str, *args) -> None:
+    _logger.info(msg, *args)
 
 
-def mark_processed(filename: str) -> None:
-    with open(PROCESSED_LOG, "a", encoding="utf-8") as f:
-        f.write(filename + "\n")
+# Separator lines, built once
+_BANNER = "=" * 70
+_RULE   = "  " + "─" * 66
 
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -217,14 +258,25 @@ def _load_hindi_fonts() -> None:
     _hindi_fonts_loaded = True
 
 
+# Character classes counted by detect_encoding / probed per table cell; each
+# is a single C-level regex scan instead of a per-character Python loop
+_DEVANAGARI_RE     = re.compile("[\u0900-\u097F]")
+_LATIN_RE          = re.compile("[A-Za-z]")
+_EXTENDED_ASCII_RE = re.compile("[\x80-\xff]")
+
+
+@functools.lru_cache(maxsize=4096)
 def _contains_devanagari(text: str) -> bool:
-    return any(0x0900 <= ord(c) <= 0x097F for c in text)
+    # Cached: reply tables repeat the same headers, labels and blank cells
+    return _DEVANAGARI_RE.search(text) is not None
 
 
 def _smart_paragraph(text: str, latin_style: ParagraphStyle,
                       hindi_style: ParagraphStyle) -> Paragraph:
     """Return a Paragraph with the Hindi font if the text contains Devanagari."""
     s = str(text)
+    if s.isascii():     # most cells; O(1) check, no cache lookup
+        return Paragraph(s, latin_style)
     return Paragraph(s, hindi_style if _contains_devanagari(s) else latin_style)
 
 
@@ -232,6 +284,11 @@ def _smart_paragraph(text: str, latin_style: ParagraphStyle,
 # ENCODING DETECTION (from document indexer)
 # ══════════════════════════════════════════════════════════════════════════════
 
+# Character pairs typical of Krutidev-encoded Hindi. Counted with str.count:
+# twelve C substring searches over a 1000-char sample beat one regex pass
+_KRUTIDEV_PATTERNS = ('k', 'Dk', '[k', 'Xk', '?k', 'Pk', 'Nk', 'Tk', 'vk', 'bZ', 'ks', 'kS')
+
+
 def detect_encoding(text: str) -> dict:
     """Intelligently detect the encoding of text."""
     if not text or len(text) < 5:
@@ -239,9 +296,9 @@ def detect_encoding(text: str) -> dict:
     
     sample = text[:1000]
     
-    devanagari_count = sum(1 for c in sample if 0x0900 <= ord(c) <= 0x097F)
-    latin_count = sum(1 for c in sample if (ord(c) >= 65 and ord(c) <= 90) or (ord(c) >= 97 and ord(c) <= 122))
-    extended_ascii_count = sum(1 for c in sample if 128 <= ord(c) < 256)
+    devanagari_count = len(_DEVANAGARI_RE.findall(sample))
+    latin_count = len(_LATIN_RE.findall(sample))
+    extended_ascii_count = len(_EXTENDED_ASCII_RE.findall(sample))
     
     total_chars = len(sample.replace(' ', '').replace('\n', '').replace('\t', ''))
     if total_chars == 0:
@@ -251,8 +308,7 @@ def detect_encoding(text: str) -> dict:
     latin_ratio = latin_count / total_chars
     extended_ascii_ratio = extended_ascii_count / total_chars
     
-    krutidev_patterns = ['k', 'Dk', '[k', 'Xk', '?k', 'Pk', 'Nk', 'Tk', 'vk', 'bZ', 'ks', 'kS']
-    krutidev_pattern_count = sum(sample.count(p) for p in krutidev_patterns)
+    krutidev_pattern_count = sum(map(sample.count, _KRUTIDEV_PATTERNS))
     krutidev_score = krutidev_pattern_count / (total_chars / 10)
     
     if devanagari_ratio > 0.3:
@@ -273,22 +329,22 @@ def smart_convert(text: str) -> tuple[str, dict]:
     detection = detect_encoding(text)
     
     if not detection['needs_conversion']:
-        log(f"    → {detection['type'].capitalize()} detected, no conversion needed")
+        log("    → %s detected, no conversion needed", detection['type'].capitalize())
         return text, detection
     
     if not KRUTIDEV_AVAILABLE:
-        log(f"    ⚠ Krutidev detected but converter not available")
+        log("    ⚠ Krutidev detected but converter not available")
         return text, detection
     
     try:
-        log(f"    ✓ Converting Krutidev to Unicode (confidence: {detection['confidence']:.2f})")
+        log("    ✓ Converting Krutidev to Unicode (confidence: %.2f)", detection['confidence'])
         converted = krutidev_to_unicode(text)
         if len(converted) < len(text) * 0.3:
-            log(f"    ⚠ Conversion produced suspiciously short text, keeping original")
+            log("    ⚠ Conversion produced suspiciously short text, keeping original")
             return text, detection
         return converted, detection
     except Exception as e:
-        log(f"    ✗ Conversion failed: {e}")
+        log("    ✗ Conversion failed: %s", e)
         return text, detection
 
 
@@ -296,16 +352,40 @@ def smart_convert(text: str) -> tuple[str, dict]:
 # TEXT EXTRACTION (from document indexer)
 # ══════════════════════════════════════════════════════════════════════════════
 
+def _pdfium_page_texts(filepath: str) -> list[str]:
+    """Page texts via PDFium; caller holds _PDFIUM_LOCK. Pages and text pages
+    are closed here so no PDFium finalizer runs later on another thread."""
+    pdf = pdfium.PdfDocument(filepath)
+    try:
+        texts = []
+        for page in pdf:
+            textpage = page.get_textpage()
+            texts.append(textpage.get_text_range())
+            textpage.close()
+            page.close()
+        return texts
+    finally:
+        pdf.close()
+
+
+def _pdf_page_texts(filepath: str) -> list[str]:
+    """Text of every page — via PDFium when available, else PyPDF2."""
+    if pdfium is not None:
+        try:
+            with _PDFIUM_LOCK:
+                return _pdfium_page_texts(filepath)
+        except Exception as e:
+            log("    pypdfium2 failed (%s) — falling back to PyPDF2", e)
+    with open(filepath, "rb") as f:
+        # Mapped: PyPDF2's many small seek+read calls become memory slices
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return [page.extract_text() for page in PyPDF2.PdfReader(mm).pages]
+
+
 def extract_text_from_pdf(filepath: str) -> str | None:
     """Extract text from PDF with encoding detection."""
     try:
-        text = ""
-        with open(filepath, "rb") as f:
-            reader = PyPDF2.PdfReader(f)
-            for page in reader.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
+        text = "".join(t + "\n" for t in _pdf_page_texts(filepath) if t)
         
         if not text.strip():
             return ""
@@ -314,7 +394,7 @@ def extract_text_from_pdf(filepath: str) -> str | None:
         return converted
         
     except Exception as e:
-        log(f"    ERROR extracting PDF: {e}")
+        log("    ERROR extracting PDF: %s", e)
         return None
 
 
@@ -326,7 +406,7 @@ def extract_text_from_docx(filepath: str) -> str | None:
         detection = detect_encoding(all_text)
         
         if detection['needs_conversion'] and CUSTOM_DOCX_EXTRACTOR:
-            log(f"    Converting entire DOCX as Krutidev")
+            log("    Converting entire DOCX as Krutidev")
             all_text = extract_docx_krutidev(filepath)
             return all_text
         
@@ -338,52 +418,66 @@ def extract_text_from_docx(filepath: str) -> str | None:
         return "\n".join(parts)
         
     except Exception as e:
-        log(f"    ERROR extracting DOCX: {e}")
+        log("    ERROR extracting DOCX: %s", e)
         return None
 
 
+def _cell_text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))      # calamine reads every number as float
+    return str(value)
+
+
+def _xlsx_sheets(filepath: str):
+    """Yield (sheet name, rows of cell values) — via calamine when available."""
+    if CalamineWorkbook is not None:
+        try:
+            wb = CalamineWorkbook.from_path(filepath)
+            sheets = [(name, wb.get_sheet_by_name(name).to_python()) for name in wb.sheet_names]
+        except Exception as e:
+            log("    calamine failed (%s) — falling back to openpyxl", e)
+        else:
+            yield from sheets
+            return
+    wb = openpyxl.load_workbook(filepath, data_only=True, read_only=True)
+    try:
+        for sheet_name in wb.sheetnames:
+            yield sheet_name, wb[sheet_name].iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
 def extract_text_from_xlsx(filepath: str) -> str | None:
     """Extract text from XLSX with encoding detection."""
     try:
-        wb = openpyxl.load_workbook(filepath, data_only=True)
         parts = []
         
-        for sheet_name in wb.sheetnames:
-            sheet = wb[sheet_name]
+        for sheet_name, rows in _xlsx_sheets(filepath):
             parts.append(f"--- Sheet: {sheet_name} ---")
-            
-            for row in sheet.iter_rows():
-                row_values = []
-                for cell in row:
-                    if cell.value is not None:
-                        val = str(cell.value)
-                        row_values.append(val)
-                    else:
-                        row_values.append("")
-                parts.append("\t".join(row_values))
+            parts.extend("\t".join(map(_cell_text, row)) for row in rows)
         
         full_text = "\n".join(parts)
         converted, _ = smart_convert(full_text)
         return converted
         
     except Exception as e:
-        log(f"    ERROR extracting XLSX: {e}")
+        log("    ERROR extracting XLSX: %s", e)
         return None
 
 
 def extract_text_from_csv(filepath: str) -> str | None:
     """Extract text from CSV with encoding detection."""
     try:
-        with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
-            reader = csv_module.reader(f)
-            rows = [row for row in reader]
-        
-        full_text = "\n".join(", ".join(row) for row in rows)
+        # Rows are joined as they are parsed — no intermediate list of rows
+        with open(filepath, "r", encoding="utf-8", errors="ignore", newline="") as f:
+            full_text = "\n".join(map(", ".join, csv_module.reader(f)))
         converted, _ = smart_convert(full_text)
         return converted
         
     except Exception as e:
-        log(f"    ERROR extracting CSV: {e}")
+        log("    ERROR extracting CSV: %s", e)
         return None
 
 
@@ -409,37 +503,130 @@ def extract_document_content(filepath: str) -> tuple[str | None, str]:
 # ATTACHMENT HANDLING
 # ══════════════════════════════════════════════════════════════════════════════
 
-def save_attachment(filename: str, payload: bytes) -> str:
-    """Saves bytes to ATTACHMENT_DIR, avoiding filename collisions."""
-    os.makedirs(ATTACHMENT_DIR, exist_ok=True)
+# Encoded bytes decoded per step when saving a base64 attachment, and the
+# file buffer those pieces are collected in before each write() syscall
+_DECODE_CHUNK = 64 * 1024
+_WRITE_BUFFER = 1024 * 1024
+
+# Content hash of each saved attachment, computed on the write pass so the
+# analysis cache never has to read the file back just to hash it
+_saved_digests: dict[str, "hashlib.blake2b"] = {}
+
+
+def save_attachment(filename: str, payload: bytes, encoding: str = "") -> str:
+    """
+    Saves *payload* to ATTACHMENT_DIR, avoiding filename collisions.
+    With encoding="base64" the payload is still base64 and is decoded in
+    _DECODE_CHUNK pieces while writing, rather than as one decoded copy.
+    """
     base, ext = os.path.splitext(filename)
-    dest = os.path.join(ATTACHMENT_DIR, filename)
-    counter = 1
-    while os.path.exists(dest):
-        dest = os.path.join(ATTACHMENT_DIR, f"{base}_{counter}{ext}")
-        counter += 1
-    with open(dest, "wb") as f:
-        f.write(payload)
-    log(f"  Saved attachment: {dest} ({len(payload):,} bytes)")
-    return dest
-
-
-def extract_supported_attachments(msg: pyzmail.PyzMessage) -> list[str]:
+    dest = ATTACHMENT_DIR / filename
+    # Claim the original name atomically; on a collision claim a random
+    # "<base>_XXXXXXXX<ext>" instead of probing _1, _2, … (not mkstemp: its
+    # files are 0600, and saved attachments should be 0644 like the rest)
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    while True:
+        try:
+            fd = os.open(dest, flags, 0o644)
+            break
+        except FileExistsError:
+            dest = ATTACHMENT_DIR / f"{base}_{uuid.uuid4().hex[:8]}{ext}"
+    size   = 0
+    digest = hashlib.blake2b(digest_size=16)
+    with os.fdopen(fd, "wb", buffering=_WRITE_BUFFER) as f:
+        if encoding == "base64":
+            carry = b""
+            view  = memoryview(payload)
+            for i in range(0, len(payload), _DECODE_CHUNK):
+                chunk = carry + bytes(view[i : i + _DECODE_CHUNK]).translate(None, b" \t\r\n")
+                cut   = len(chunk) - len(chunk) % 4
+                data  = binascii.a2b_base64(chunk[:cut])
+                digest.update(data)
+                size += f.write(data)
+                carry = chunk[cut:]
+            if carry:           # unpadded tail — pad it like email's decoder does
+                try:
+                    data = binascii.a2b_base64(carry + b"=" * (-len(carry) % 4))
+                except binascii.Error:
+                    pass
+                else:
+                    digest.update(data)
+                    size += f.write(data)
+        else:
+            digest.update(payload)
+            size += f.write(payload)
+    _saved_digests[str(dest)] = digest
+    log("  Saved attachment: %s (%s bytes)", dest, format(size, ","))
+    return str(dest)
+
+
+@functools.lru_cache(maxsize=4096)
+def _decode_header_value(value: str) -> str:
+    """Decode RFC 2047 encoded-words; returns *value* unchanged if that fails.
+    Cached, since a retried message brings the same raw header back."""
+    if "=?" not in value:
+        return value
+    try:
+        return str(make_header(decode_header(value)))
+    except (LookupError, UnicodeError, ValueError):
+        return value
+
+
+# bytes.decode() has a C fast path for the standard UTF-8/ASCII names; any
+# other charset costs a codec-registry lookup, so those decoders are cached.
+_FAST_CHARSETS = frozenset({"utf-8", "utf8", "us-ascii", "ascii"})
+
+
+@functools.lru_cache(maxsize=32)
+def _charset_decoder(charset: str):
+    try:
+        return codecs.lookup(charset).decode
+    except LookupError:                     # unknown charset name
+        return codecs.utf_8_decode
+
+
+def _decode_text(raw: bytes, charset: str | None) -> str:
+    """Decode a text part in *charset* (default UTF-8), dropping bad bytes."""
+    charset = (charset or "utf-8").lower()
+    if charset in _FAST_CHARSETS:
+        return raw.decode(charset, errors="ignore")
+    return _charset_decoder(charset)(raw, "ignore")[0]
+
+
+def _get_text_body(msg: Message) -> str:
+    """Decode the first text/plain part that isn't an attachment."""
+    for part in msg.walk():
+        if part.get_content_type() != "text/plain" or part.get_content_disposition() == "attachment":
+            continue
+        return _decode_text(part.get_payload(decode=True) or b"", part.get_content_charset())
+    return "(No text body)"
+
+
+def extract_supported_attachments(msg: Message) -> list[str]:
     """Returns list of saved file paths for all supported document types."""
     saved_paths = []
-    for part in msg.mailparts:
-        if part.disposition != "attachment" and part.filename is None:
+    for part in msg.walk():
+        if part.is_multipart():
+            continue
+        filename = part.get_filename()
+        if part.get_content_disposition() != "attachment" and filename is None:
             continue
-        filename = part.filename or "attachment"
+        filename = _decode_header_value(filename) if filename else "attachment"
         extension = os.path.splitext(filename)[1].lower()
         
         if extension not in SUPPORTED_EXTENSIONS:
             continue
             
-        payload = part.get_payload()
+        raw = part.get_payload()
+        if (isinstance(raw, str)
+                and part.get("Content-Transfer-Encoding", "").strip().lower() == "base64"):
+            # Decoded while writing — the whole decoded file is never held in memory
+            payload, encoding = raw.encode("ascii", errors="ignore"), "base64"
+        else:
+            payload, encoding = part.get_payload(decode=True), ""
         if not isinstance(payload, bytes):
             continue
-        path = save_attachment(filename, payload)
+        path = save_attachment(filename, payload, encoding)
         saved_paths.append(path)
     return saved_paths
 
@@ -533,6 +720,70 @@ TEXT CONTENT:
 """
 
 
+# Each template is rendered once with a placeholder and split around it, so a
+# request is a plain concatenation rather than a str.format pass over the
+# whole (up to 50k-char) document text
+_TABLE_PROMPT = tuple(OPENAI_TABLE_USER.format(text_content="\0").split("\0"))
+_BRIEF_PROMPT = tuple(OPENAI_BRIEF_USER.format(text_content="\0").split("\0"))
+
+
+# Lines kept either side of each table-like line (headings, captions)
+_TABLE_CONTEXT = 3
+
+# Rows that carry no tab or pipe but still look like table data: columns
+# aligned with runs of spaces (PDF text), or two or more separate numbers
+_ALIGNED_ROW_RE = re.compile(r"\S {2,}\S")
+_NUMBER_RE      = re.compile(r"\d[\d,.:/-]*")
+
+
+def _is_table_row(line: str) -> bool:
+    return ("\t" in line or line.count("|") >= 2
+            or _ALIGNED_ROW_RE.search(line) is not None
+            or len(_NUMBER_RE.findall(line)) >= 2)
+
+
+def _tabular_lines(text: str) -> str:
+    """
+    Keep only table-like lines (tab- or pipe-separated cells, as the DOCX and
+    XLSX extractors emit, plus space-aligned or number-heavy rows) and
+    _TABLE_CONTEXT lines around each; skipped stretches become "...".
+    Returns *text* unchanged if nothing or most of it looks tabular, or if it
+    is a workbook.
+    """
+    # Prose-only text (most PDFs) is ruled out by two C-level scans
+    if "\t" not in text and text.count("|") < 2:
+        return text
+    # XLSX text is all table, single-column sheets (no tabs) included
+    if text.startswith("--- Sheet: "):
+        return text
+
+    lines = text.split("\n")
+    hits  = [i for i, line in enumerate(lines) if _is_table_row(line)]
+    # Nothing tabular, or mostly table already: filtering would save little
+    # and could drop a heading or a row the checks above don't recognise
+    if not hits or len(hits) * 2 >= len(lines):
+        return text
+
+    # Merge the context windows around each hit into (start, end) spans
+    spans: list[list[int]] = []
+    for i in hits:
+        start, end = max(0, i - _TABLE_CONTEXT), i + _TABLE_CONTEXT + 1
+        if spans and start <= spans[-1][1]:
+            spans[-1][1] = end
+        else:
+            spans.append([start, end])
+
+    out, prev = [], 0
+    for start, end in spans:
+        if start > prev:
+            out.append("...")
+        out.extend(lines[start:end])
+        prev = end
+    if prev < len(lines):
+        out.append("...")
+    return "\n".join(out)
+
+
 def extract_columns_from_text(text: str) -> tuple[list[str], dict[str, list[str]]]:
     """
     Send extracted text to OpenAI to find tables and extract column headers.
@@ -543,17 +794,23 @@ def extract_columns_from_text(text: str) -> tuple[list[str], dict[str, list[str]
     columns_by_table : {"table_1": [...], "table_2": [...], ...}  ← kept separate
     """
     try:
+        # Only the tables matter here — narrative text is just prompt tokens
+        tabular = _tabular_lines(text)
+        if len(tabular) < len(text):
+            log("    Kept table-like lines: %s → %s chars", format(len(text), ","), format(len(tabular), ","))
+            text = tabular
+
         max_chars = 50000
         if len(text) > max_chars:
-            log(f"    Truncating text from {len(text):,} to {max_chars:,} chars")
+            log("    Truncating text from %s to %s chars", format(len(text), ","), format(max_chars, ","))
             text = text[:max_chars] + "\n...[truncated]"
 
-        log(f"    Sending to OpenAI to find tables...")
+        log("    Sending to OpenAI to find tables...")
         response = openai_client.chat.completions.create(
             model=OPENAI_MODEL,
             messages=[
                 {"role": "system", "content": OPENAI_TABLE_SYSTEM},
-                {"role": "user",   "content": OPENAI_TABLE_USER.format(text_content=text)},
+                {"role": "user",   "content": _TABLE_PROMPT[0] + text + _TABLE_PROMPT[1]},
             ],
             temperature=0,
         )
@@ -573,31 +830,31 @@ def extract_columns_from_text(text: str) -> tuple[list[str], dict[str, list[str]
                 json_str = raw[start:end + 1]
 
         if not json_str:
-            log(f"    No JSON block found — no tables detected.")
+            log("    No JSON block found — no tables detected.")
             return [], {}
 
         parsed = json.loads(json_str)
         columns_by_table: dict[str, list[str]] = parsed.get("columns_by_table", {})
 
         if not columns_by_table:
-            log(f"    No tables found.")
+            log("    No tables found.")
             return [], {}
 
         # Log each table separately
         flat_columns: list[str] = []
         seen: set[str] = set()
         for table_key, headers in columns_by_table.items():
-            log(f"    ✓ {table_key}: {headers}")
+            log("    ✓ %s: %s", table_key, headers)
             for h in headers:
                 if h not in seen:
                     flat_columns.append(h)
                     seen.add(h)
 
-        log(f"    → {len(columns_by_table)} table(s) | {len(flat_columns)} unique columns total")
+        log("    → %d table(s) | %d unique columns total", len(columns_by_table), len(flat_columns))
         return flat_columns, columns_by_table
 
     except Exception as e:
-        log(f"    OpenAI API error: {e}")
+        log("    OpenAI API error: %s", e)
         return [], {}
 
 
@@ -606,17 +863,19 @@ def get_document_brief(text: str) -> dict | None:
     try:
         max_chars = 50000
         if len(text) > max_chars:
-            log(f"    Truncating text for brief analysis")
+            log("    Truncating text for brief analysis")
             text = text[:max_chars] + "\n...[truncated]"
         
-        log(f"    Getting document brief from OpenAI...")
+        log("    Getting document brief from OpenAI...")
         response = openai_client.chat.completions.create(
             model=OPENAI_MODEL,
             messages=[
                 {"role": "system", "content": OPENAI_BRIEF_SYSTEM},
-                {"role": "user", "content": OPENAI_BRIEF_USER.format(text_content=text)},
+                {"role": "user", "content": _BRIEF_PROMPT[0] + text + _BRIEF_PROMPT[1]},
             ],
             temperature=0,
+            # JSON mode: the reply is the bare object — no fences, no trailing prose
+            response_format={"type": "json_object"},
         )
         raw = response.choices[0].message.content.strip()
         
@@ -624,17 +883,17 @@ def get_document_brief(text: str) -> dict | None:
             raw = raw.replace("```json", "").replace("```", "").strip()
         start, end = raw.find("{"), raw.rfind("}")
         if start == -1 or end == -1:
-            log(f"    Could not get document brief")
+            log("    Could not get document brief")
             return None
         
         brief = json.loads(raw[start:end + 1])
-        log(f"    ✓ Document type: {brief.get('document_type', 'Unknown')}")
-        log(f"    ✓ Data content: {brief.get('data_content_summary', 'N/A')[:100]}")
-        log(f"    ✓ Main topics: {brief.get('main_topics', [])}")
+        log("    ✓ Document type: %s", brief.get('document_type', 'Unknown'))
+        log("    ✓ Data content: %s", brief.get('data_content_summary', 'N/A')[:100])
+        log("    ✓ Main topics: %s", brief.get('main_topics', []))
         return brief
         
     except Exception as e:
-        log(f"    Brief analysis error: {e}")
+        log("    Brief analysis error: %s", e)
         return None
 
 
@@ -642,6 +901,22 @@ def get_document_brief(text: str) -> dict | None:
 # OPENCLAW INTEGRATION (ORIGINAL LOGIC - NO CHANGES)
 # ══════════════════════════════════════════════════════════════════════════════
 
+# One keep-alive session for every OpenClaw call, so each email reuses the
+# pooled connection instead of paying a new TCP/TLS handshake. Only
+# connection errors are retried; a sent request is never replayed.
+_OPENCLAW_SESSION = requests.Session()
+_OPENCLAW_SESSION.headers.update({
+    "Authorization": f"Bearer {TOKEN}",
+    "Content-Type": "application/json",
+    "x-openclaw-agent-id": "main",
+})
+_openclaw_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8,
+                                max_retries=Retry(total=3, connect=3, read=0,
+                                                  status=0, backoff_factor=0.5))
+_OPENCLAW_SESSION.mount("http://",  _openclaw_adapter)
+_OPENCLAW_SESSION.mount("https://", _openclaw_adapter)
+
+
 def call_openclaw(subject: str, sender: str, body: str,
                   columns_by_table: dict[str, list[str]],
                   document_brief: dict | None = None) -> dict | None:
@@ -706,14 +981,9 @@ Body    :
         "model": "openclaw",
         "messages": [{"role": "user", "content": prompt}]
     }
-    headers = {
-        "Authorization": f"Bearer {TOKEN}",
-        "Content-Type": "application/json",
-        "x-openclaw-agent-id": "main"
-    }
 
     try:
-        resp = requests.post(OPENCLAW_URL, headers=headers, json=payload, timeout=120)
+        resp = _OPENCLAW_SESSION.post(OPENCLAW_URL, json=payload, timeout=120)
         resp.raise_for_status()
         raw = resp.json()["choices"][0]["message"]["content"]
         log("  --- OpenClaw response (first 500 chars) ---")
@@ -721,10 +991,15 @@ Body    :
         log("  -------------------------------------------")
         return _parse_json(raw)
     except Exception as e:
-        log(f"  OpenClaw API error: {e}")
+        log("  OpenClaw API error: %s", e)
         return None
 
 
+_JSON_DECODER = json.JSONDecoder()
+# Opening ```json / ``` fence or closing ``` fence, stripped in one pass
+_FENCE_RE = re.compile(r"^```(?:json)?\s*|```\s*$", re.IGNORECASE)
+
+
 def _parse_json(raw: str) -> dict | None:
     """
     Robustly extract the outermost JSON object from an LLM response.
@@ -736,19 +1011,29 @@ def _parse_json(raw: str) -> dict | None:
       - Nested JSON inside the object (rfind was breaking this before)
     """
     try:
-        cleaned = raw.strip()
+        # OpenClaw is told to answer with bare JSON — usually it does
+        try:
+            parsed = json.loads(raw)
+        except json.JSONDecodeError:
+            pass
+        else:
+            if isinstance(parsed, dict):
+                return parsed
 
         # Strip markdown fences first
-        cleaned = re.sub(r"^```json\s*", "", cleaned, flags=re.IGNORECASE)
-        cleaned = re.sub(r"^```\s*",    "", cleaned)
-        cleaned = re.sub(r"```\s*$",    "", cleaned)
-        cleaned = cleaned.strip()
+        cleaned = _FENCE_RE.sub("", raw.strip()).strip()
 
-        # Find the outermost {...} by counting braces (handles nested objects)
         start = cleaned.find("{")
         if start == -1:
             raise ValueError("No JSON object found in response.")
 
+        # Happy path: the C decoder parses the object and ignores what follows
+        try:
+            return _JSON_DECODER.raw_decode(cleaned, start)[0]
+        except json.JSONDecodeError:
+            pass
+
+        # Find the outermost {...} by counting braces (handles nested objects)
         depth   = 0
         in_str  = False
         escape  = False
@@ -780,8 +1065,8 @@ def _parse_json(raw: str) -> dict | None:
         return json.loads(cleaned[start:end_idx + 1])
 
     except (json.JSONDecodeError, ValueError) as e:
-        log(f"  JSON parse error: {e}")
-        log(f"  Raw response snippet: {raw[:300]}")
+        log("  JSON parse error: %s", e)
+        log("  Raw response snippet: %s", raw[:300])
         return None
 
 
@@ -789,8 +1074,66 @@ def _parse_json(raw: str) -> dict | None:
 # REPLY DOCUMENT CREATION - SAME FORMAT AS RECEIVED
 # ══════════════════════════════════════════════════════════════════════════════
 
+def _generated_at(when: datetime.datetime | None = None) -> str:
+    """The "Generated on" timestamp shown in reply documents."""
+    return (when or datetime.datetime.now()).strftime("%Y-%m-%d %H:%M:%S")
+
+
+# Short rows are padded with "" up to the header count:
+#     islice(chain(row, _EMPTY_CELLS), len(headers))
+_EMPTY_CELLS = repeat("")
+
+
+@functools.lru_cache(maxsize=1)
+def _pdf_styles() -> dict[str, ParagraphStyle]:
+    """Paragraph styles for create_reply_pdf — built once, after the Hindi
+    fonts are registered (their names are baked into the styles)."""
+    _load_hindi_fonts()
+    styles = getSampleStyleSheet()
+    return {
+        "normal":     styles["Normal"],
+        "heading2":   styles["Heading2"],
+        "title":      ParagraphStyle("CustomTitle", parent=styles["Title"],
+                                     fontSize=14, spaceAfter=12),
+        "cell_latin": ParagraphStyle("CellLatin", parent=styles["Normal"],
+                                     fontSize=8, leading=11, fontName="Helvetica"),
+        "cell_hindi": ParagraphStyle("CellHindi", parent=styles["Normal"],
+                                     fontSize=8, leading=11, fontName=_hindi_font_regular),
+        "hdr_latin":  ParagraphStyle("HdrLatin", parent=styles["Normal"],
+                                     fontSize=8, leading=11,
+                                     textColor=colors.white, fontName="Helvetica-Bold"),
+        "hdr_hindi":  ParagraphStyle("HdrHindi", parent=styles["Normal"],
+                                     fontSize=8, leading=11,
+                                     textColor=colors.white, fontName=_hindi_font_bold),
+        "tbl_title":  ParagraphStyle("TblTitle", parent=styles["Heading2"],
+                                     fontSize=11, spaceAfter=6),
+        "fact_latin": ParagraphStyle("FactLatin", parent=styles["Normal"],
+                                     fontSize=8, leading=12, leftIndent=10,
+                                     fontName="Helvetica"),
+        "fact_hindi": ParagraphStyle("FactHindi", parent=styles["Normal"],
+                                     fontSize=8, leading=12, leftIndent=10,
+                                     fontName=_hindi_font_regular),
+    }
+
+
+# Shared by every reply table — Table.setStyle only reads the commands
+_REPLY_TABLE_STYLE = TableStyle([
+    ("BACKGROUND",     (0, 0), (-1, 0), colors.HexColor("#2C3E50")),
+    ("TEXTCOLOR",      (0, 0), (-1, 0), colors.white),
+    ("FONTNAME",       (0, 0), (-1, 0), "Helvetica-Bold"),
+    ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.HexColor("#F2F2F2")]),
+    ("GRID",           (0, 0), (-1, -1), 0.5, colors.HexColor("#CCCCCC")),
+    ("VALIGN",         (0, 0), (-1, -1), "TOP"),
+    ("TOPPADDING",     (0, 0), (-1, -1), 4),
+    ("BOTTOMPADDING",  (0, 0), (-1, -1), 4),
+    ("LEFTPADDING",    (0, 0), (-1, -1), 4),
+    ("RIGHTPADDING",   (0, 0), (-1, -1), 4),
+])
+
+
 def create_reply_pdf(tables: list[dict], subject: str, output_path: str,
-                     facts: list[str] | None = None) -> str:
+                     facts: list[str] | None = None,
+                     generated_at: str | None = None) -> str:
     """
     Creates a styled PDF with ONE section per table.
     Each table gets its own heading + grid.
@@ -803,8 +1146,6 @@ def create_reply_pdf(tables: list[dict], subject: str, output_path: str,
             "rows":    [["val1", "val2", ...], ...]
         }
     """
-    _load_hindi_fonts()
-
     if not tables:
         raise ValueError("No tables provided for PDF creation.")
 
@@ -818,32 +1159,20 @@ def create_reply_pdf(tables: list[dict], subject: str, output_path: str,
         topMargin=2 * cm, bottomMargin=2 * cm,
     )
 
-    styles = getSampleStyleSheet()
+    styles = _pdf_styles()
     story  = []
 
     # ── Document title ──────────────────────────────────────────────────────
-    title_style = ParagraphStyle("CustomTitle", parent=styles["Title"],
-                                 fontSize=14, spaceAfter=12)
-    story.append(Paragraph(f"Response: {subject}", title_style))
+    story.append(Paragraph(f"Response: {subject}", styles["title"]))
     story.append(Paragraph(
-        f"Generated on {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-        styles["Normal"]
+        f"Generated on {generated_at or _generated_at()}",
+        styles["normal"]
     ))
     story.append(Spacer(1, 0.5 * cm))
 
     # ── Shared cell styles (Latin + Hindi) ──────────────────────────────────
-    cell_latin = ParagraphStyle("CellLatin", parent=styles["Normal"],
-                                fontSize=8, leading=11, fontName="Helvetica")
-    cell_hindi = ParagraphStyle("CellHindi", parent=styles["Normal"],
-                                fontSize=8, leading=11, fontName=_hindi_font_regular)
-    hdr_latin  = ParagraphStyle("HdrLatin", parent=styles["Normal"],
-                                fontSize=8, leading=11,
-                                textColor=colors.white, fontName="Helvetica-Bold")
-    hdr_hindi  = ParagraphStyle("HdrHindi", parent=styles["Normal"],
-                                fontSize=8, leading=11,
-                                textColor=colors.white, fontName=_hindi_font_bold)
-    tbl_title_style = ParagraphStyle("TblTitle", parent=styles["Heading2"],
-                                     fontSize=11, spaceAfter=6)
+    cell_latin, cell_hindi = styles["cell_latin"], styles["cell_hindi"]
+    hdr_latin,  hdr_hindi  = styles["hdr_latin"],  styles["hdr_hindi"]
 
     usable_width = page_size[0] - 3 * cm
 
@@ -854,58 +1183,63 @@ def create_reply_pdf(tables: list[dict], subject: str, output_path: str,
         rows      = tbl_data.get("rows",    [])
 
         if not headers:
-            log(f"  ⚠ Table {idx} has no headers — skipping.")
+            log("  ⚠ Table %d has no headers — skipping.", idx)
             continue
 
-        story.append(Paragraph(tbl_title, tbl_title_style))
+        story.append(Paragraph(tbl_title, styles["tbl_title"]))
 
         # Build rows
         table_body = [[_smart_paragraph(str(h), hdr_latin, hdr_hindi) for h in headers]]
         for row in rows:
-            padded = list(row) + [""] * (len(headers) - len(row))
-            padded = padded[:len(headers)]
             table_body.append([
-                _smart_paragraph(str(cell), cell_latin, cell_hindi) for cell in padded
+                _smart_paragraph(str(cell), cell_latin, cell_hindi)
+                for cell in islice(chain(row, _EMPTY_CELLS), len(headers))
             ])
 
         col_width = usable_width / len(headers)
         tbl = Table(table_body, colWidths=[col_width] * len(headers), repeatRows=1)
-        tbl.setStyle(TableStyle([
-            ("BACKGROUND",     (0, 0), (-1, 0), colors.HexColor("#2C3E50")),
-            ("TEXTCOLOR",      (0, 0), (-1, 0), colors.white),
-            ("FONTNAME",       (0, 0), (-1, 0), "Helvetica-Bold"),
-            ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.HexColor("#F2F2F2")]),
-            ("GRID",           (0, 0), (-1, -1), 0.5, colors.HexColor("#CCCCCC")),
-            ("VALIGN",         (0, 0), (-1, -1), "TOP"),
-            ("TOPPADDING",     (0, 0), (-1, -1), 4),
-            ("BOTTOMPADDING",  (0, 0), (-1, -1), 4),
-            ("LEFTPADDING",    (0, 0), (-1, -1), 4),
-            ("RIGHTPADDING",   (0, 0), (-1, -1), 4),
-        ]))
+        tbl.setStyle(_REPLY_TABLE_STYLE)
         story.append(tbl)
         story.append(Spacer(1, 0.6 * cm))   # gap between tables
 
     # ── Source facts ─────────────────────────────────────────────────────────
     if facts:
         story.append(Spacer(1, 0.4 * cm))
-        story.append(Paragraph("Source Facts", styles["Heading2"]))
+        story.append(Paragraph("Source Facts", styles["heading2"]))
         story.append(Spacer(1, 0.2 * cm))
-        fact_latin = ParagraphStyle("FactLatin", parent=styles["Normal"],
-                                    fontSize=8, leading=12, leftIndent=10,
-                                    fontName="Helvetica")
-        fact_hindi = ParagraphStyle("FactHindi", parent=styles["Normal"],
-                                    fontSize=8, leading=12, leftIndent=10,
-                                    fontName=_hindi_font_regular)
         for i, fact in enumerate(facts, start=1):
-            story.append(_smart_paragraph(f"{i}. {fact}", fact_latin, fact_hindi))
+            story.append(_smart_paragraph(f"{i}. {fact}", styles["fact_latin"], styles["fact_hindi"]))
 
     doc.build(story)
-    log(f"  Reply PDF created: {output_path} ({len(tables)} table(s))")
+    log("  Reply PDF created: %s (%d table(s))", output_path, len(tables))
     return output_path
 
 
+# Line breaks and tabs in a cell become <w:br/> / <w:tab/>, as cell.text does
+_DOCX_RUN_SPLIT = re.compile(r"(\n|\t)")
+_DOCX_RUN_PART  = {"\n": "<w:br/>", "\t": "<w:tab/>"}
+# Header cells: bold, 11 pt (w:sz counts half-points)
+_DOCX_HEADER_RPR = '<w:rPr><w:b/><w:sz w:val="22"/></w:rPr>'
+
+
+def _docx_row_xml(row_data, widths: list[str], rpr: str = "") -> str:
+    """<w:tr> for one DOCX table row; cells past the header count are dropped.
+    *rpr* is run formatting applied to every cell's text."""
+    cells = []
+    for width, value in zip(widths, chain(row_data, _EMPTY_CELLS)):
+        text = str(value)
+        run = "".join(
+            _DOCX_RUN_PART.get(part) or f'<w:t xml:space="preserve">{xml_escape(part)}</w:t>'
+            for part in _DOCX_RUN_SPLIT.split(text) if part
+        )
+        para = f"<w:p><w:r>{rpr}{run}</w:r></w:p>" if run else "<w:p/>"
+        cells.append(f'<w:tc><w:tcPr><w:tcW w:type="dxa" w:w="{width}"/></w:tcPr>{para}</w:tc>')
+    return f"<w:tr>{''.join(cells)}</w:tr>"
+
+
 def create_reply_docx(tables: list[dict], subject: str, output_path: str,
-                      facts: list[str] | None = None) -> str:
+                      facts: list[str] | None = None,
+                      generated_at: str | None = None) -> str:
     """Creates a DOCX with one section per table."""
     if not tables:
         raise ValueError("No tables provided for DOCX creation.")
@@ -914,7 +1248,7 @@ def create_reply_docx(tables: list[dict], subject: str, output_path: str,
 
     title = doc.add_heading(f"Response: {subject}", level=1)
     title.alignment = WD_ALIGN_PARAGRAPH.LEFT
-    doc.add_paragraph(f"Generated on {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    doc.add_paragraph(f"Generated on {generated_at or _generated_at()}")
 
     for idx, tbl_data in enumerate(tables, start=1):
         tbl_title = tbl_data.get("title") or f"Table {idx}"
@@ -927,23 +1261,15 @@ def create_reply_docx(tables: list[dict], subject: str, output_path: str,
         doc.add_paragraph()
         doc.add_heading(tbl_title, level=2)
 
-        table = doc.add_table(rows=len(rows) + 1, cols=len(headers))
+        table = doc.add_table(rows=0, cols=len(headers))
         table.style = 'Light Grid Accent 1'
 
-        header_cells = table.rows[0].cells
-        for i, header in enumerate(headers):
-            cell = header_cells[i]
-            cell.text = str(header)
-            for paragraph in cell.paragraphs:
-                for run in paragraph.runs:
-                    run.font.bold = True
-                    run.font.size = Pt(11)
-
-        for row_idx, row_data in enumerate(rows, start=1):
-            row_cells = table.rows[row_idx].cells
-            for col_idx, cell_data in enumerate(row_data):
-                if col_idx < len(headers):
-                    row_cells[col_idx].text = str(cell_data)
+        # All rows are written as one XML fragment and parsed once — setting
+        # cell.text (and run fonts) per cell costs several DOM operations each
+        widths = [col.get(qn("w:w")) for col in table._tbl.tblGrid.gridCol_lst]
+        trs = [_docx_row_xml(headers, widths, _DOCX_HEADER_RPR)]
+        trs.extend(_docx_row_xml(row_data, widths) for row_data in rows)
+        table._tbl.extend(parse_xml(f"<w:tbl {nsdecls('w')}>{''.join(trs)}</w:tbl>").tr_lst)
 
     if facts:
         doc.add_paragraph()
@@ -952,18 +1278,25 @@ def create_reply_docx(tables: list[dict], subject: str, output_path: str,
             doc.add_paragraph(f"{i}. {fact}", style='List Number')
 
     doc.save(output_path)
-    log(f"  Reply DOCX created: {output_path} ({len(tables)} table(s))")
+    log("  Reply DOCX created: %s (%d table(s))", output_path, len(tables))
     return output_path
 
 
+# Characters Excel forbids in sheet names: slashes become "-", the rest are dropped
+_SHEET_SANITIZE = str.maketrans({"/": "-", "\\": "-", "*": "", "?": "", "[": "", "]": "", ":": ""})
+
+
 def create_reply_xlsx(tables: list[dict], subject: str, output_path: str,
-                      facts: list[str] | None = None) -> str:
+                      facts: list[str] | None = None,
+                      generated_at: str | None = None) -> str:
     """Creates an XLSX with one sheet per table."""
     if not tables:
         raise ValueError("No tables provided for XLSX creation.")
 
-    wb = openpyxl.Workbook()
-    wb.remove(wb.active)   # remove default empty sheet
+    # Write-only: rows stream straight to the sheet XML instead of building
+    # a cell grid in memory (and there is no default sheet to remove)
+    wb = openpyxl.Workbook(write_only=True)
+    generated_line = [f"Generated on {generated_at or _generated_at()}"]
 
     for idx, tbl_data in enumerate(tables, start=1):
         tbl_title = tbl_data.get("title") or f"Table {idx}"
@@ -974,35 +1307,45 @@ def create_reply_xlsx(tables: list[dict], subject: str, output_path: str,
             continue
 
         # Sheet name max 31 chars, strip illegal chars
-        sheet_name = tbl_title[:31].replace("/", "-").replace("\\", "-").replace("*", "").replace("?", "").replace("[", "").replace("]", "").replace(":", "")
+        sheet_name = tbl_title[:31].translate(_SHEET_SANITIZE)
         ws = wb.create_sheet(title=sheet_name)
 
-        ws.append([f"Response: {subject}"])
-        ws.append([f"Generated on {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"])
-        ws.append([tbl_title])
-        ws.append([])
-
-        header_row_num = ws.max_row + 1
-        ws.append(headers)
-        for cell in ws[header_row_num]:
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="2C3E50", end_color="2C3E50", fill_type="solid")
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-
+        banner = [
+            [f"Response: {subject}"],
+            generated_line,
+            [tbl_title],
+            [],
+        ]
+        # Write-only sheets emit their column widths before the first row, so
+        # each value is measured once while its row is padded
+        widths = [len(str(h)) if h is not None else 0 for h in headers]
+        widths[0] = max(widths[0], *(len(line[0]) for line in banner if line))
+        padded_rows = []
         for row_data in rows:
-            padded = list(row_data) + [""] * (len(headers) - len(row_data))
-            ws.append(padded[:len(headers)])
-
-        for column in ws.columns:
-            max_length = 0
-            col_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if cell.value and len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            ws.column_dimensions[col_letter].width = min(max_length + 2, 50)
+            padded = list(islice(chain(row_data, _EMPTY_CELLS), len(headers)))
+            widths = [max(w, len(str(v))) if v is not None else w
+                      for w, v in zip(widths, padded)]
+            padded_rows.append(padded)
+        for i, w in enumerate(widths, start=1):
+            ws.column_dimensions[get_column_letter(i)].width = min(w + 2, 50)
+
+        for row in banner:
+            ws.append(row)
+
+        header_font  = Font(bold=True, color="FFFFFF")
+        header_fill  = PatternFill(start_color="2C3E50", end_color="2C3E50", fill_type="solid")
+        header_align = Alignment(horizontal="center", vertical="center")
+        header_cells = []
+        for h in headers:
+            cell = WriteOnlyCell(ws, value=h)
+            cell.font = header_font
+            cell.fill = header_fill
+            cell.alignment = header_align
+            header_cells.append(cell)
+        ws.append(header_cells)
+
+        for padded in padded_rows:
+            ws.append(padded)
 
     if facts:
         ws_facts = wb.create_sheet(title="Source Facts")
@@ -1012,7 +1355,7 @@ def create_reply_xlsx(tables: list[dict], subject: str, output_path: str,
             ws_facts.append([f"{i}. {fact}"])
 
     wb.save(output_path)
-    log(f"  Reply XLSX created: {output_path} ({len(tables)} sheet(s))")
+    log("  Reply XLSX created: %s (%d sheet(s))", output_path, len(tables))
     return output_path
 
 
@@ -1021,7 +1364,8 @@ def create_reply_csv(tables: list[dict], output_path: str) -> str:
     if not tables:
         raise ValueError("No tables provided for CSV creation.")
 
-    with open(output_path, "w", newline="", encoding="utf-8") as f:
+    # 1 MiB buffer: the file is written in a few large chunks, not per row
+    with open(output_path, "w", newline="", encoding="utf-8", buffering=1 << 20) as f:
         writer = csv_module.writer(f)
         for idx, tbl_data in enumerate(tables, start=1):
             tbl_title = tbl_data.get("title") or f"Table {idx}"
@@ -1037,13 +1381,24 @@ def create_reply_csv(tables: list[dict], output_path: str) -> str:
             writer.writerow([tbl_title])
             writer.writerow(headers)
             for row_data in rows:
-                padded = list(row_data) + [""] * (len(headers) - len(row_data))
-                writer.writerow(padded[:len(headers)])
+                writer.writerow(islice(chain(row_data, _EMPTY_CELLS), len(headers)))
 
-    log(f"  Reply CSV created: {output_path} ({len(tables)} table(s))")
+    log("  Reply CSV created: %s (%d table(s))", output_path, len(tables))
     return output_path
 
 
+# Reply writer and file-name template per original extension (PDF otherwise).
+# Emails are handled concurrently, so the name carries a random suffix: two
+# replies made in the same second must not share a file.
+_REPLY_WRITERS = {
+    ".pdf":  (create_reply_pdf,  "reply_{ts}_{uid}.pdf"),
+    ".docx": (create_reply_docx, "reply_{ts}_{uid}.docx"),
+    ".xlsx": (create_reply_xlsx, "reply_{ts}_{uid}.xlsx"),
+    ".csv":  (create_reply_csv,  "reply_{ts}_{uid}.csv"),
+}
+_DEFAULT_REPLY_WRITER = _REPLY_WRITERS[".pdf"]
+
+
 def create_reply_document(tables: list[dict], subject: str, original_extension: str,
                           facts: list[str] | None = None) -> str:
     """
@@ -1051,130 +1406,290 @@ def create_reply_document(tables: list[dict], subject: str, original_extension:
     PDF → PDF, DOCX → DOCX, XLSX → XLSX, CSV → CSV
     All formats now support multiple tables.
     """
-    os.makedirs(ATTACHMENT_DIR, exist_ok=True)
-    ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-
-    dispatch = {
-        ".pdf":  (create_reply_pdf,  f"reply_{ts}.pdf"),
-        ".docx": (create_reply_docx, f"reply_{ts}.docx"),
-        ".xlsx": (create_reply_xlsx, f"reply_{ts}.xlsx"),
-        ".csv":  (create_reply_csv,  f"reply_{ts}.csv"),
-    }
+    now = datetime.datetime.now()
 
-    creator_fn, filename = dispatch.get(original_extension, (create_reply_pdf, f"reply_{ts}.pdf"))
-    output_path = os.path.join(ATTACHMENT_DIR, filename)
+    creator_fn, name_tmpl = _REPLY_WRITERS.get(original_extension, _DEFAULT_REPLY_WRITER)
+    output_path = str(ATTACHMENT_DIR / name_tmpl.format(
+        ts=now.strftime("%Y%m%d_%H%M%S"), uid=uuid.uuid4().hex[:8]))
 
-    if original_extension == ".csv":
+    if creator_fn is create_reply_csv:
         return creator_fn(tables, output_path)
     else:
-        return creator_fn(tables, subject, output_path, facts)
+        return creator_fn(tables, subject, output_path, facts,
+                          generated_at=_generated_at(now))
 
 
 # ══════════════════════════════════════════════════════════════════════════════
 # EMAIL REPLY
 # ══════════════════════════════════════════════════════════════════════════════
 
+# Replies go out on one background thread over a kept-open SMTP session, so
+# an email worker is free as soon as its reply is queued. Only that thread
+# touches _smtp_server.
+_smtp_server: smtplib.SMTP | None = None
+_SMTP_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="smtp")
+
+# set_content picks the lightest transfer encoding that is 7-bit safe: plain
+# 7bit for ASCII bodies, else whichever of quoted-printable/base64 is shorter
+_REPLY_POLICY = default_policy.clone(cte_type="7bit")
+
+
+def _reply_subject(subject: str) -> str:
+    """Reply subject, unfolded: the default policy rejects CR/LF in header
+    values, and subjects from the compat32 parse keep their folding."""
+    return "Re: " + " ".join(subject.split())
+
+
+def _smtp_connect() -> smtplib.SMTP:
+    """Return the shared SMTP session, connecting + STARTTLS + LOGIN on first use."""
+    global _smtp_server
+    if _smtp_server is None:
+        server = smtplib.SMTP(*SMTP_ARGS)
+        server.starttls()
+        server.login(*SMTP_CREDS)
+        _smtp_server = server
+    return _smtp_server
+
+
+def _smtp_reset() -> None:
+    """Close the shared SMTP session so the next send reconnects."""
+    global _smtp_server
+    if _smtp_server is not None:
+        try:
+            _smtp_server.quit()
+        except Exception:
+            _smtp_server.close()
+        _smtp_server = None
+
+
+def _deliver(to_email: str, msg: EmailMessage, sent_note: str, *note_args) -> None:
+    """Send one queued reply (runs on _SMTP_POOL); logs *sent_note* % *note_args* once sent."""
+    try:
+        # The server may have dropped an idle session — reconnect once.
+        for attempt in range(2):
+            try:
+                _smtp_connect().send_message(msg, SMTP_EMAIL, [to_email])
+                break
+            except smtplib.SMTPServerDisconnected:
+                _smtp_reset()
+                if attempt:
+                    raise
+        log(sent_note, *note_args)
+    except Exception as e:
+        log("  SMTP error: %s", e)
+
+
 def send_reply_with_attachment(to_email: str, subject: str,
                                 body_text: str, attachment_path: str) -> None:
-    """Send reply email with attachment."""
+    """Queue reply email with attachment."""
     try:
-        msg = MIMEMultipart()
+        msg = EmailMessage(policy=_REPLY_POLICY)
         msg["From"]    = SMTP_EMAIL
         msg["To"]      = to_email
-        msg["Subject"] = f"Re: {subject}"
+        msg["Subject"] = _reply_subject(subject)
+        msg.set_content(body_text)
 
-        msg.attach(MIMEText(body_text, "plain", "utf-8"))
-
-        with open(attachment_path, "rb") as f:
-            part = MIMEBase("application", "octet-stream")
-            part.set_payload(f.read())
-        encoders.encode_base64(part)
+        # The file is base64-encoded straight into the message; the raw bytes
+        # are dropped once this returns, and send_message flattens to bytes
+        # only on the SMTP thread
         attachment_name = os.path.basename(attachment_path)
-        part.add_header("Content-Disposition", f'attachment; filename="{attachment_name}"')
-        msg.attach(part)
-
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SMTP_EMAIL, SMTP_PASSWORD)
-            server.sendmail(SMTP_EMAIL, to_email, msg.as_string())
+        with open(attachment_path, "rb") as f:
+            msg.add_attachment(f.read(), maintype="application", subtype="octet-stream",
+                               filename=attachment_name)
 
-        log(f"  Reply sent to {to_email} with attachment: {attachment_name}")
+        _SMTP_POOL.submit(_deliver, to_email, msg,
+                          "  Reply sent to %s with attachment: %s", to_email, attachment_name)
     except Exception as e:
-        log(f"  SMTP error: {e}")
+        log("  SMTP error: %s", e)
 
 
 def send_text_only_reply(to_email: str, subject: str, body: str) -> None:
-    """Send text-only reply email."""
+    """Queue text-only reply email."""
     try:
-        msg = MIMEMultipart()
+        msg = EmailMessage(policy=_REPLY_POLICY)
         msg["From"]    = SMTP_EMAIL
         msg["To"]      = to_email
-        msg["Subject"] = f"Re: {subject}"
-        msg.attach(MIMEText(body, "plain", "utf-8"))
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SMTP_EMAIL, SMTP_PASSWORD)
-            server.sendmail(SMTP_EMAIL, to_email, msg.as_string())
-        log(f"  Text-only reply sent to {to_email}")
+        msg["Subject"] = _reply_subject(subject)
+        msg.set_content(body)
+        _SMTP_POOL.submit(_deliver, to_email, msg,
+                          "  Text-only reply sent to %s", to_email)
     except Exception as e:
-        log(f"  SMTP error: {e}")
+        log("  SMTP error: %s", e)
 
 
 # ══════════════════════════════════════════════════════════════════════════════
 # MAIN EMAIL HANDLER
 # ══════════════════════════════════════════════════════════════════════════════
 
+# Attachments of one email are extracted and sent to OpenAI concurrently;
+# both are mostly I/O (file reads, HTTPS) so threads overlap well
+_EXTRACT_POOL = ThreadPoolExecutor(max_workers=min(8, (os.cpu_count() or 1) * 2),
+                                   thread_name_prefix="extract")
+# Separate pool: _EXTRACT_POOL workers block on these, so sharing one pool
+# could leave every worker waiting on a request queued behind it
+_OPENAI_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="openai")
+
+
+# ── Analysis cache ───────────────────────────────────────────────────────────
+# Keyed by a hash of the attachment's bytes (and the model), so a re-sent
+# template or forwarded file skips extraction and both OpenAI calls. Briefs
+# are also kept by a hash of the extracted text, which catches the same
+# document arriving as a different file (re-exported PDF, DOCX copy, …).
+
+_analysis_db: sqlite3.Connection | None = None
+_analysis_lock = threading.Lock()
+
+
+def _analysis_cache() -> sqlite3.Connection:
+    global _analysis_db
+    if _analysis_db is None:
+        _analysis_db = sqlite3.connect(ANALYSIS_CACHE, isolation_level=None,
+                                       check_same_thread=False)
+        _analysis_db.execute(
+            "CREATE TABLE IF NOT EXISTS analysis (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        _analysis_db.execute(
+            "CREATE TABLE IF NOT EXISTS brief (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+    return _analysis_db
+
+
+def _file_key(file_path: str) -> str:
+    digest = _saved_digests.pop(file_path, None)
+    if digest is None:          # not saved by this process — hash the file
+        with open(file_path, "rb") as f:
+            digest = hashlib.file_digest(f, lambda: hashlib.blake2b(digest_size=16))
+    digest.update(OPENAI_MODEL.encode())
+    return digest.hexdigest()
+
+
+def _analysis_cache_get(key: str) -> tuple | None:
+    with _analysis_lock:
+        row = _analysis_cache().execute(
+            "SELECT value FROM analysis WHERE key = ?", (key,)
+        ).fetchone()
+    if not row:
+        return None
+    value = json.loads(row[0])
+    return value["extension"], value["brief"], value["columns"], value["columns_by_table"]
+
+
+def _analysis_cache_put(key: str, extension: str, brief: dict, flat_cols: list[str],
+                        cols_by_table: dict[str, list[str]]) -> None:
+    value = {"extension": extension, "brief": brief,
+             "columns": flat_cols, "columns_by_table": cols_by_table}
+    with _analysis_lock:
+        _analysis_cache().execute(
+            "INSERT OR REPLACE INTO analysis (key, value) VALUES (?, ?)",
+            (key, json.dumps(value, ensure_ascii=False)),
+        )
+
+
+def _cached_brief(text: str) -> dict | None:
+    """get_document_brief, memoized by a BLAKE2b hash of the text (and model)."""
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=16)
+    digest.update(OPENAI_MODEL.encode())
+    key = digest.hexdigest()
+    with _analysis_lock:
+        row = _analysis_cache().execute(
+            "SELECT value FROM brief WHERE key = ?", (key,)
+        ).fetchone()
+    if row:
+        return json.loads(row[0])
+
+    brief = get_document_brief(text)
+    if brief is not None:
+        with _analysis_lock:
+            _analysis_cache().execute(
+                "INSERT OR REPLACE INTO brief (key, value) VALUES (?, ?)",
+                (key, json.dumps(brief, ensure_ascii=False)),
+            )
+    return brief
+
+
+def _analyze_attachment(file_path: str) -> tuple[str, dict | None, list[str],
+                                                  dict[str, list[str]] | None]:
+    """
+    Extract one attachment and run the OpenAI brief and table passes on it.
+    Returns (extension, brief, flat_columns, columns_by_table);
+    columns_by_table is None when no text could be extracted.
+    """
+    filename = os.path.basename(file_path)
+    log("\n  Processing: %s", filename)
+    log(_RULE)
+
+    cache_key = _file_key(file_path)
+    cached = _analysis_cache_get(cache_key)
+    if cached is not None:
+        log("    ✓ Cache hit — reusing earlier analysis [%s]", filename)
+        return cached
+
+    extracted_text, extension = extract_document_content(file_path)
+
+    if extracted_text is None:
+        log("    ✗ Extraction failed [%s]", filename)
+        return extension, None, [], None
+
+    if not extracted_text.strip():
+        log("    ⚠ No text extracted (empty document) [%s]", filename)
+        return extension, None, [], None
+
+    log("    ✓ Extracted %s characters [%s]", format(len(extracted_text), ","), filename)
+
+    preview = extracted_text[:150].replace('\n', ' ')[:120]
+    log("    Preview: %s...", preview)
+
+    # The two OpenAI requests are independent — run the brief alongside
+    brief = _OPENAI_POOL.submit(_cached_brief, extracted_text)
+    flat_cols, cols_by_table = extract_columns_from_text(extracted_text)
+    brief = brief.result()
+    # Failed OpenAI calls come back as None / {} — only cache full answers
+    if brief is not None and cols_by_table:
+        _analysis_cache_put(cache_key, extension, brief, flat_cols, cols_by_table)
+    return extension, brief, flat_cols, cols_by_table
+
+
 def on_new_email(subject: str, sender: str, body: str,
                  attachment_paths: list[str]) -> None:
     """Process new email with attachments."""
-    log("="*70)
+    log(_BANNER)
     log("NEW EMAIL")
-    log("="*70)
-    log(f"From    : {sender}")
-    log(f"Subject : {subject}")
-    log(f"Preview : {body[:120].replace(chr(10), ' ')}")
-    log(f"Attachments ({len(attachment_paths)}): {[os.path.basename(p) for p in attachment_paths]}")
-    log("="*70)
-
-    processed = load_processed()
+    log(_BANNER)
+    log("From    : %s", sender)
+    log("Subject : %s", subject)
+    log("Preview : %s", body[:120].replace("\n", " "))
+    log("Attachments (%d): %s", len(attachment_paths), [os.path.basename(p) for p in attachment_paths])
+    log(_BANNER)
+
     all_columns: list[str] = []
     all_columns_by_table: dict[str, list[str]] = {}   # ← keeps tables separate
     all_briefs = []
     original_extension = None
     
+    pending = []
     for file_path in attachment_paths:
         filename = os.path.basename(file_path)
-        
-        if filename in processed:
-            log(f"  Already processed '{filename}' — skipping.")
+        if is_processed(filename):
+            log("  Already processed '%s' — skipping.", filename)
+            _saved_digests.pop(file_path, None)
             continue
-        
-        log(f"\n  Processing: {filename}")
-        log(f"  {'─'*66}")
-        
-        extracted_text, extension = extract_document_content(file_path)
+        pending.append(file_path)
+
+    # All attachments are analysed at once; results are merged in mail order
+    futures = [_EXTRACT_POOL.submit(_analyze_attachment, p) for p in pending]
+
+    for file_path, future in zip(pending, futures):
+        filename = os.path.basename(file_path)
+        extension, brief, flat_cols, cols_by_table = future.result()
         
         if original_extension is None:
             original_extension = extension
         
-        if extracted_text is None:
-            log(f"    ✗ Extraction failed")
-            continue
-        
-        if not extracted_text.strip():
-            log(f"    ⚠ No text extracted (empty document)")
+        if cols_by_table is None:       # nothing extracted
             continue
         
-        log(f"    ✓ Extracted {len(extracted_text):,} characters")
-        
-        preview = extracted_text[:150].replace('\n', ' ')[:120]
-        log(f"    Preview: {preview}...")
-        
-        brief = get_document_brief(extracted_text)
         if brief:
             all_briefs.append(brief)
-        
-        flat_cols, cols_by_table = extract_columns_from_text(extracted_text)
 
         # Merge into the running dicts, namespacing keys by filename to avoid
         # collisions when multiple attachments are present
@@ -1192,49 +1707,29 @@ def on_new_email(subject: str, sender: str, body: str,
         return
     
     # Unique flat list (for logging only)
-    seen: set[str] = set()
-    unique_columns: list[str] = []
-    for col in all_columns:
-        if col not in seen:
-            unique_columns.append(col)
-            seen.add(col)
+    unique_columns = list(dict.fromkeys(all_columns))
     
-    log(f"\n  Total tables found   : {len(all_columns_by_table)}")
-    log(f"  Total unique columns : {len(unique_columns)}")
+    log("\n  Total tables found   : %d", len(all_columns_by_table))
+    log("  Total unique columns : %d", len(unique_columns))
     
     combined_brief = None
     if all_briefs:
-        all_topics = []
-        all_dates = []
-        all_locations = []
-        all_ref_nums = []
-        all_people = []
-        summaries = []
-        
-        for brief in all_briefs:
-            summaries.append(brief.get('brief_summary', ''))
-            all_topics.extend(brief.get('main_topics', []))
-            entities = brief.get('key_entities', {})
-            all_dates.extend(entities.get('dates', []))
-            all_locations.extend(entities.get('locations', []))
-            all_ref_nums.extend(entities.get('reference_numbers', []))
-            all_people.extend(entities.get('people', []))
-        
+        # Flatten each list field across briefs, de-duplicated in first-seen order
+        entities = [b.get('key_entities', {}) for b in all_briefs]
         combined_brief = {
             'document_type': all_briefs[0].get('document_type', 'Unknown'),
-            'brief_summary': ' '.join(summaries),
-            'main_topics': list(set(all_topics)),
+            'brief_summary': ' '.join(b.get('brief_summary', '') for b in all_briefs),
+            'main_topics': list(dict.fromkeys(
+                chain.from_iterable(b.get('main_topics', []) for b in all_briefs))),
             'key_entities': {
-                'dates': list(set(all_dates)),
-                'locations': list(set(all_locations)),
-                'reference_numbers': list(set(all_ref_nums)),
-                'people': list(set(all_people))
+                field: list(dict.fromkeys(chain.from_iterable(e.get(field, []) for e in entities)))
+                for field in ('dates', 'locations', 'reference_numbers', 'people')
             }
         }
         
-        log(f"\n  Document Brief:")
-        log(f"    Type: {combined_brief['document_type']}")
-        log(f"    Topics: {combined_brief['main_topics']}")
+        log("\n  Document Brief:")
+        log("    Type: %s", combined_brief['document_type'])
+        log("    Topics: %s", combined_brief['main_topics'])
     
     log("\n  Calling OpenClaw...")
     result = call_openclaw(subject, sender, body, all_columns_by_table, combined_brief)
@@ -1243,16 +1738,16 @@ def on_new_email(subject: str, sender: str, body: str,
         log("  OpenClaw analysis failed — skipping.")
         return
     
-    log(f"\n  Category : {result.get('category', 'unknown')}")
-    log(f"  Priority : {result.get('priority', 'unknown')}")
-    log(f"  Language : {result.get('language_of_reply', 'unknown')}")
+    log("\n  Category : %s", result.get('category', 'unknown'))
+    log("  Priority : %s", result.get('priority', 'unknown'))
+    log("  Language : %s", result.get('language_of_reply', 'unknown'))
     
     matched = result.get("matched_documents", [])
     if matched:
-        log(f"  Matched docs ({len(matched)}): {[d.get('file_name') for d in matched]}")
+        log("  Matched docs (%d): %s", len(matched), [d.get('file_name') for d in matched])
     
     if result.get("reply_note"):
-        log(f"  Note     : {result['reply_note']}")
+        log("  Note     : %s", result['reply_note'])
     
     requires_reply  = result.get("requires_reply", False)
     suggested_reply = result.get("suggested_reply", "").strip()
@@ -1279,31 +1774,31 @@ def on_new_email(subject: str, sender: str, body: str,
     # Format A
     if result.get("tables"):
         tables = result["tables"]
-        log(f"\n  Tables resolved via Format A (top-level 'tables' key): {len(tables)}")
+        log("\n  Tables resolved via Format A (top-level 'tables' key): %d", len(tables))
 
     # Format B  ← what the updated skill returns
     if not tables:
         td = result.get("table_data") or {}
         if isinstance(td, dict) and td.get("tables"):
             tables = td["tables"]
-            log(f"\n  Tables resolved via Format B (table_data.tables): {len(tables)}")
+            log("\n  Tables resolved via Format B (table_data.tables): %d", len(tables))
 
     # Format C  ← legacy single-table fallback
     if not tables:
         td = result.get("table_data") or {}
         if isinstance(td, dict) and td.get("headers"):
             tables = [td]
-            log(f"\n  Tables resolved via Format C (legacy single table_data): {len(tables)}")
+            log("\n  Tables resolved via Format C (legacy single table_data): %d", len(tables))
 
     if not tables:
-        log(f"\n  table_data in response: {result.get('table_data')}")
-        log(f"\n  Tables in OpenClaw response: 0")
+        log("\n  table_data in response: %s", result.get('table_data'))
+        log("\n  Tables in OpenClaw response: 0")
     else:
-        log(f"\n  Tables in OpenClaw response: {len(tables)}")
+        log("\n  Tables in OpenClaw response: %d", len(tables))
         for i, t in enumerate(tables, 1):
             n_rows = len(t.get("rows", []))
             n_cols = len(t.get("headers", []))
-            log(f"    Table {i}: '{t.get('title', '(no title)')}' — {n_cols} cols, {n_rows} rows")
+            log("    Table %d: '%s' — %d cols, %d rows", i, t.get('title', '(no title)'), n_cols, n_rows)
 
     if not tables:
         log("\n  No table data — sending text-only reply.")
@@ -1311,7 +1806,7 @@ def on_new_email(subject: str, sender: str, body: str,
             send_text_only_reply(sender, subject, suggested_reply)
         return
 
-    log(f"\n  Creating reply in format: {original_extension}")
+    log("\n  Creating reply in format: %s", original_extension)
 
     try:
         reply_path = create_reply_document(
@@ -1321,7 +1816,7 @@ def on_new_email(subject: str, sender: str, body: str,
             facts=facts
         )
     except Exception as e:
-        log(f"\n  Document creation failed: {e} — sending text-only reply.")
+        log("\n  Document creation failed: %s — sending text-only reply.", e)
         if suggested_reply:
             send_text_only_reply(sender, subject, suggested_reply)
         return
@@ -1330,68 +1825,263 @@ def on_new_email(subject: str, sender: str, body: str,
         "Please find the extracted data attached.\n\nRegards,\nAuto-Reply System"
     )
     send_reply_with_attachment(sender, subject, reply_body, reply_path)
-    log("\n" + "="*70)
+    log("\n" + _BANNER)
 
 
 # ══════════════════════════════════════════════════════════════════════════════
 # IMAP INBOX POLLING
 # ══════════════════════════════════════════════════════════════════════════════
 
-def check_for_new_mail() -> None:
-    """Check for new unread emails and process them."""
-    with imaplib.IMAP4_SSL(IMAP_HOST) as server:
-        server.login(EMAIL, PASSWORD)
+_imap_server: imaplib.IMAP4_SSL | None = None
+
+
+def _imap_connect() -> imaplib.IMAP4_SSL:
+    """Return the shared IMAP session, logging in and selecting INBOX on first use."""
+    global _imap_server
+    if _imap_server is None:
+        log("Connecting to IMAP …")
+        server = imaplib.IMAP4_SSL(*IMAP_ARGS)
+        server.login(*IMAP_CREDS)
         server.select("INBOX")
+        _imap_server = server
+    return _imap_server
 
-        today = datetime.date.today().strftime("%d-%b-%Y")
-        _, uids = server.search(None, f'(UNSEEN SINCE "{today}")')
 
-        if not uids or not uids[0]:
-            log("No new emails.")
-            return
+def _imap_reset() -> None:
+    """Drop the shared IMAP session so the next call to _imap_connect reconnects."""
+    global _imap_server
+    if _imap_server is not None:
+        try:
+            _imap_server.logout()
+        except Exception:
+            pass
+        _imap_server = None
 
-        uid_list = uids[0].split()
-        log(f"Found {len(uid_list)} new email(s).")
 
-        for uid in uid_list:
-            _, raw_data = server.fetch(uid, "(RFC822)")
-            if not raw_data or not raw_data[0]:
-                continue
+# Gmail drops an IDLE after ~10 minutes; re-issue it before that
+_IDLE_TIMEOUT = 540
+
+# Socket of the IDLE in progress, shut down by _request_stop to end it early
+_idle_socket: socket.socket | None = None
 
-            msg = pyzmail.PyzMessage.factory(raw_data[0][1])
 
-            subject   = msg.get_subject() or "(No Subject)"
-            addresses = msg.get_addresses("from")
-            sender    = addresses[0][1] if addresses else "unknown"
+def _idle_wait(server: imaplib.IMAP4_SSL, timeout: float = _IDLE_TIMEOUT) -> bool:
+    """
+    Block in IMAP IDLE until the server pushes an EXISTS (new mail) or
+    *timeout* seconds pass. Returns True if new mail was reported.
+    imaplib (< 3.14) has no IDLE command, so it is driven by hand here.
+    """
+    tag = server._new_tag()
+    server.send(tag + b" IDLE\r\n")
+    resp = server.readline()
+    if not resp.startswith(b"+"):
+        raise imaplib.IMAP4.error(f"IDLE rejected: {resp!r}")
+
+    global _idle_socket
+    sock     = server.socket()
+    deadline = time.monotonic() + timeout
+    new_mail = False
+    _idle_socket = sock
+    try:
+        while not new_mail and not _STOP.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            sock.settimeout(remaining)
+            try:
+                line = server.readline()
+            except TimeoutError:
+                # A timed-out socket file refuses further reads; reopen it
+                server.file = sock.makefile("rb")
+                break
+            if not line:
+                raise imaplib.IMAP4.abort("connection closed during IDLE")
+            new_mail = line.rstrip().upper().endswith(b"EXISTS")
+    finally:
+        _idle_socket = None
+        sock.settimeout(None)
+
+    server.send(b"DONE\r\n")
+    while True:      # drain untagged responses up to the IDLE completion
+        line = server.readline()
+        if not line:
+            raise imaplib.IMAP4.abort("connection closed during IDLE")
+        if line.startswith(tag):
+            break
+    return new_mail
+
+
+def wait_for_mail() -> None:
+    """
+    Return once new mail may be waiting: immediately if some arrived while
+    the last batch was being handled, otherwise when IDLE reports it or
+    times out. Servers without IDLE fall back to sleeping CHECK_INTERVAL.
+    """
+    server = _imap_connect()
+    if server.untagged_responses.pop("EXISTS", None):
+        return
+    if "IDLE" not in server.capabilities:
+        _STOP.wait(CHECK_INTERVAL)
+        return
+    log("Waiting for new mail (IDLE) …")
+    _idle_wait(server)
 
-            if msg.text_part:
-                charset = msg.text_part.charset or "utf-8"
-                body = msg.text_part.get_payload().decode(charset, errors="ignore")
+
+def check_for_new_mail() -> None:
+    """Check for new unread emails over the shared IMAP session and process
+    them. A dropped connection is re-established and the check retried once."""
+    for attempt in range(2):
+        try:
+            _check_mailbox(_imap_connect())
+            return
+        except (imaplib.IMAP4.abort, OSError) as e:
+            _imap_reset()
+            if attempt:
+                raise
+            log("IMAP connection lost (%s) — reconnecting …", e)
+
+
+# A message's BODYSTRUCTURE and Subject/From are fetched before the message
+# itself; the body is only downloaded when the structure names a supported
+# file. Encoded-word and RFC 2231 names can hide the extension, so those
+# always count as a possible match.
+_HIDDEN_NAME_RE = re.compile(rb'=\?|\*(?:\d+\*?)?"')
+_EXTENSION_NEEDLES = tuple(ext.encode() for ext in SUPPORTED_EXTENSIONS)
+
+
+def _fetch_preview(server: imaplib.IMAP4_SSL, uid: bytes) -> tuple[bytes, Message]:
+    """Return (raw BODYSTRUCTURE text, Subject/From headers) for message *uid*."""
+    _, data = server.uid("FETCH", uid, "(BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS (SUBJECT FROM)])")
+    structure, header = [], b""
+    for piece in data or []:
+        if isinstance(piece, tuple):
+            line, literal = piece
+            cut = line.upper().find(b"BODY[HEADER")
+            if cut >= 0:
+                structure.append(line[:cut])
+                header = literal
             else:
-                body = "(No text body)"
+                structure += (line, literal)
+        elif isinstance(piece, bytes):
+            structure.append(piece)
+    return b" ".join(structure), BytesHeaderParser(policy=compat32).parsebytes(header)
+
+
+def _may_have_attachment(structure: bytes) -> bool:
+    """True unless *structure* proves no part carries a supported extension."""
+    lowered = structure.lower()
+    return (any(ext in lowered for ext in _EXTENSION_NEEDLES)
+            or _HIDDEN_NAME_RE.search(lowered) is not None)
 
-            attachment_paths = extract_supported_attachments(msg)
+
+# Emails handled concurrently (each mostly waits on OpenAI / OpenClaw / SMTP).
+# _check_mailbox submits each email once its attachments are saved, so a
+# burst is worked through in parallel instead of one email after another.
+# Only the polling thread touches IMAP.
+_MAX_EMAIL_WORKERS = 4
+_EMAIL_POOL = ThreadPoolExecutor(max_workers=_MAX_EMAIL_WORKERS, thread_name_prefix="email")
+
+
+def _check_mailbox(server: imaplib.IMAP4_SSL) -> None:
+    """Search INBOX for today's unseen emails and process each one."""
+    # NOOP keeps the session alive and lets the server report new mail;
+    # EXISTS seen after this point means mail arrived during processing
+    server.noop()
+    server.untagged_responses.pop("EXISTS", None)
+
+    today = datetime.date.today().strftime("%d-%b-%Y")
+    # UIDs, not sequence numbers: the session stays open across checks and
+    # another client may expunge messages before the final STORE
+    _, uids = server.uid("SEARCH", None, f'(UNSEEN SINCE "{today}")')
+
+    if not uids or not uids[0]:
+        log("No new emails.")
+        return
+
+    uid_list = uids[0].split()
+    log("Found %d new email(s).", len(uid_list))
+
+    to_mark: list[bytes] = []           # flagged \Seen with one STORE at the end
+    futures: list[tuple[bytes, Future]] = []
+    try:
+        for uid in uid_list:
+            structure, hdrs = _fetch_preview(server, uid)
+
+            subject   = _decode_header_value(str(hdrs.get("Subject", ""))) or "(No Subject)"
+            sender    = parseaddr(hdrs.get("From", ""))[1] or "unknown"
+
+            attachment_paths: list[str] = []
+            if _may_have_attachment(structure):
+                # PEEK: \Seen is only set once the email has been handled
+                _, raw_data = server.uid("FETCH", uid, "(BODY.PEEK[])")
+                if not raw_data or not raw_data[0]:
+                    log("Email %s could not be fetched — marking it read.", uid.decode())
+                    to_mark.append(uid)
+                    continue
+                # compat32 leaves part payloads encoded until they are asked for
+                msg = BytesParser(policy=compat32).parsebytes(raw_data[0][1])
+                attachment_paths = extract_supported_attachments(msg)
 
             if attachment_paths:
-                on_new_email(subject, sender, body, attachment_paths)
-            else:
-                log(f"No supported attachments in email from {sender} — skipping.")
+                # Only emails that get handled need their text body decoded
+                futures.append((uid, _EMAIL_POOL.submit(on_new_email, subject, sender,
+                                                        _get_text_body(msg), attachment_paths)))
+                continue
 
-            server.store(uid, "+FLAGS", "\\Seen")
+            log("No supported attachments in email from %s — skipping.", sender)
+            to_mark.append(uid)
+
+        for uid, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                # Marked read all the same: an email that always fails would
+                # otherwise be fetched and re-sent to the LLMs on every wake-up
+                log("Email %s failed: %s — marking it read.", uid.decode(), e)
+            to_mark.append(uid)
+    except BaseException:
+        # Let submitted emails finish before the caller reconnects
+        wait([future for _, future in futures])
+        raise
+    finally:
+        if to_mark:
+            server.uid("STORE", b",".join(to_mark), "+FLAGS", "\\Seen")
 
 
 # ══════════════════════════════════════════════════════════════════════════════
 # MAIN LOOP
 # ══════════════════════════════════════════════════════════════════════════════
 
+# Upper bound for the exponential reconnect back-off (1, 2, 4, … seconds)
+_RECONNECT_MAX_DELAY = 60
+
+# Set by SIGTERM/SIGINT; the loop waits on it instead of sleeping so shutdown
+# happens once the current check is done instead of after a full interval.
+_STOP = threading.Event()
+
+
+def _request_stop(signum, frame) -> None:
+    """Signal handler: stop after the current check; a second signal aborts."""
+    if _STOP.is_set():
+        raise KeyboardInterrupt
+    log(f"Received signal {signum} — shutting down …")
+    _STOP.set()
+    sock = _idle_socket
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)     # wakes the blocked IDLE read
+        except OSError:
+            pass
+
+
 def main() -> None:
-    """Main polling loop."""
-    log("="*70)
+    """Main loop: check the inbox, then wait in IMAP IDLE for new mail."""
+    log(_BANNER)
     log("ENHANCED EMAIL PIPELINE - Same Format Reply")
-    log("="*70)
+    log(_BANNER)
     log(f"Supported types : {', '.join(SUPPORTED_EXTENSIONS)}")
     log(f"Attachment dir  : {ATTACHMENT_DIR}/")
-    log(f"Poll interval   : {CHECK_INTERVAL}s")
+    log(f"Wake-up         : IMAP IDLE ({CHECK_INTERVAL}s polling if unsupported)")
     log(f"Krutidev support: {'✓ Available' if KRUTIDEV_AVAILABLE else '✗ Not available'}")
     log(f"AI provider     : OpenAI ({OPENAI_MODEL})")
     log(f"Reply format    : SAME as received (PDF→PDF, DOCX→DOCX, etc.)")
@@ -1399,15 +2089,42 @@ def main() -> None:
     # Pre-load Hindi font at startup so any warnings appear immediately
     _load_hindi_fonts()
     log(f"Hindi PDF font  : {_hindi_font_regular}")
-    log("="*70)
+    log(_BANNER)
     log("")
 
-    while True:
-        try:
-            check_for_new_mail()
-        except Exception as e:
-            log(f"Error in main loop: {e}")
-        time.sleep(CHECK_INTERVAL)
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, _request_stop)
+
+    failures = 0
+    try:
+        while not _STOP.is_set():
+            try:
+                check_for_new_mail()
+                failures = 0
+            except (imaplib.IMAP4.abort, OSError) as e:
+                delay = min(_RECONNECT_MAX_DELAY, 2 ** failures)
+                failures += 1
+                log(f"IMAP unavailable ({e}) — reconnecting in {delay}s …")
+                _STOP.wait(delay)
+                continue
+            except Exception as e:
+                log(f"Error in main loop: {e}")
+                _STOP.wait(CHECK_INTERVAL)
+                continue
+            if _STOP.is_set():
+                break
+            try:
+                wait_for_mail()
+            except Exception as e:
+                if _STOP.is_set():
+                    break
+                # check_for_new_mail reconnects on the next pass
+                log(f"IDLE interrupted ({e}) — checking again.")
+                _imap_reset()
+    finally:
+        _imap_reset()
+        _SMTP_POOL.shutdown(wait=True)      # let queued replies go out
+        _smtp_reset()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,39 @@
+"""
+envfile.py
+----------
+Reads the .env file (plain KEY=VALUE lines) into os.environ. Variables
+already set in the environment take precedence over the file.
+
+Kept apart from config.py so standalone scripts can load their settings
+without config's required pipeline keys and import-time setup.
+"""
+
+import functools
+import os
+
+# .env lives in the same directory as this file
+_DOTENV_PATH = os.path.join(os.path.dirname(__file__), ".env")
+
+
+def _parse_env(path: str) -> dict[str, str]:
+    """Parse simple KEY=VALUE lines; blank lines and # comments are skipped."""
+    out: dict[str, str] = {}
+    with open(path, "rb") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line[:1] == b"#":
+                continue
+            key, sep, value = line.partition(b"=")
+            if not sep:
+                continue
+            out[key.strip().decode()] = value.strip().strip(b"\"'").decode()
+    return out
+
+
+@functools.lru_cache(maxsize=1)
+def load_env() -> bool:
+    """Load .env into os.environ (memoized — the file is read at most once)."""
+    if os.path.exists(_DOTENV_PATH):
+        for key, value in _parse_env(_DOTENV_PATH).items():
+            os.environ.setdefault(key, value)
+    return True
@@ -14,6 +14,17 @@ def replace_string(text, find, replace):
     return text.replace(find, replace)
 
 
+# Single-pass form of the "– and —" rule in krutidev_to_unicode: matches an
+# 'a'/'b' that is not the last character and is not followed by a Krutidev
+# consonant or matrā.
+_MISPLACED_DASH_RE = re.compile(
+    '[ab](?=.)(?![%s])' % re.escape(''.join(
+        c for c in CONSONANTS['krutidev'] + UNATTACHED['krutidev'] if len(c) == 1
+    )),
+    re.DOTALL,
+)
+
+
 def krutidev_to_unicode(text):
     """
     Convert Krutidev text to Unicode (Devanagari)
@@ -30,16 +41,7 @@ def krutidev_to_unicode(text):
     text = replace_string(text, ' z', 'z')
 
     # – and — if not surrounded by krutidev consonants/matrās, change them to -
-    misplaced = re.compile('[ab]', re.DOTALL)
-    for result in misplaced.finditer(text):
-        length = len(result.group())
-        index = result.start()
-        if (
-            index < len(text) - 1 and
-            text[index + 1] not in CONSONANTS['krutidev'] and
-            text[index + 1] not in UNATTACHED['krutidev']
-        ):
-            text = text[:index] + '&' + text[index + 1:]
+    text = _MISPLACED_DASH_RE.sub('&', text)
 
     # Apply main dictionary replacements
     for find, replace in MAIN: